@@ -0,0 +1,158 @@
+import http.client
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlencode, urlsplit
+
+# Point this at a local stub server to run the ingestion without the real API
+API_URL = os.environ.get("API_SOCCER_URL", "http://api.football-data.org")
+
+# Free tier quota of football-data.org
+CALLS_PER_MINUTE = 10
+
+
+class RateLimiter:
+    # Token bucket refilled at calls_per_minute, synced with the API's own counters.
+    # It holds a single token: the calls are spaced 60 / calls_per_minute seconds apart,
+    # a full bucket would allow twice the quota in the first minute. Calls made before
+    # this process started are in the API's counters, see sync
+    def __init__(self, calls_per_minute=CALLS_PER_MINUTE):
+        self.capacity = 1
+        self.rate = calls_per_minute / 60
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.refill(now)
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def sync(self, available, reset):
+        # X-Requests-Available-Minute and X-RequestCounter-Reset from the last response
+        with self.lock:
+            now = time.monotonic()
+            self.refill(now)
+            if available is not None:
+                self.tokens = min(self.tokens, available)
+            if available == 0 and reset is not None:
+                self.blocked_until = max(self.blocked_until, now + reset)
+
+
+class ApiError(Exception):
+    pass
+
+
+class Client:
+    def __init__(
+        self,
+        token,
+        base_url=API_URL,
+        calls_per_minute=CALLS_PER_MINUTE,
+        workers=4,
+        retries=5,
+        backoff=2.0,
+        timeout=30,
+    ):
+        url = urlsplit(base_url)
+        self.connection_class = (
+            http.client.HTTPSConnection
+            if url.scheme == "https"
+            else http.client.HTTPConnection
+        )
+        self.host = url.netloc
+        self.prefix = url.path.rstrip("/")
+        self.headers = {"X-Auth-Token": token} if token else {}
+        self.limiter = RateLimiter(calls_per_minute)
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def connection(self):
+        # http.client connections are not thread safe, one keep-alive connection per thread
+        if getattr(self.local, "connection", None) is None:
+            self.local.connection = self.connection_class(
+                self.host, timeout=self.timeout
+            )
+        return self.local.connection
+
+    def reset_connection(self):
+        if getattr(self.local, "connection", None) is not None:
+            self.local.connection.close()
+            self.local.connection = None
+
+    def get(self, path, **params):
+        url = self.prefix + path
+        if params:
+            url += "?" + urlencode(params)
+
+        for attempt in range(self.retries + 1):
+            self.limiter.acquire()
+            try:
+                connection = self.connection()
+                connection.request("GET", url, None, self.headers)
+                response = connection.getresponse()
+                body = response.read()
+            except (OSError, http.client.HTTPException) as e:
+                self.reset_connection()
+                error = e
+                wait = self.backoff * 2**attempt
+            else:
+                available = response.getheader("X-Requests-Available-Minute")
+                reset = response.getheader("X-RequestCounter-Reset")
+                self.limiter.sync(
+                    int(available) if available is not None else None,
+                    int(reset) if reset is not None else None,
+                )
+                if response.status == 200:
+                    return json.loads(body.decode())
+
+                error = ApiError(f"{response.status} for {url}: {body[:200]!r}")
+                if response.status == 429:
+                    # Quota exhausted, the reset header tells how long to wait
+                    self.limiter.sync(0, int(reset) if reset is not None else 60)
+                    wait = 0
+                elif response.status >= 500:
+                    wait = self.backoff * 2**attempt
+                else:
+                    raise error
+            time.sleep(wait)
+
+        raise error
+
+    def matches(self, competition, season, **filters):
+        return self.get(
+            f"/v2/competitions/{competition}/matches", season=season, **filters
+        )
+
+    def iter_matches(self, keys, key_filters=None, **filters):
+        # Concurrent requests, the rate limiter keeps the total within the quota.
+        # Responses are yielded as soon as they arrive, in completion order
+        key_filters = key_filters or {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {
+                executor.submit(
+                    self.matches, *key, **filters, **key_filters.get(key, {})
+                ): key
+                for key in keys
+            }
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
+    def matches_many(self, keys, key_filters=None, **filters):
+        return dict(self.iter_matches(keys, key_filters, **filters))
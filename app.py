@@ -2,21 +2,52 @@ import dash
 import dash_core_components as dcc
 import dash_bootstrap_components as dbc
 import dash_html_components as html
-from dash.dependencies import Input, Output
-import plotly.graph_objects as go
+from dash.dependencies import ClientsideFunction, Input, Output
 import pandas as pd
-import numpy as np
 from dash.exceptions import PreventUpdate
+from flask_compress import Compress
 from functions import (
-    fill_df_teams,
-    read_data,
-    update_axes,
-    preprocess_avg_points,
-    fill_points_df,
+    team_lists,
+    team_names,
+    bar_trace,
+    line_trace,
+    figure,
+    outcome_figure,
+    points_series,
+    rolling_points,
+    goal_metrics,
+    goals_table,
 )
-
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.LUX])
+import cube
+import elo
+import figcache
+import instrument
+import refresh
+import snapshot
+import stats
+import store
+
+app = dash.Dash(__name__, external_stylesheets=[dbc.themes.LUX], compress=False)
 server = app.server
+# Dash only enables gzip. Brotli at a fast level for clients that accept it, gzip for
+# the others, see python benchmark.py --payload
+server.config.update(COMPRESS_ALGORITHM=["br", "gzip"], COMPRESS_BR_LEVEL=4)
+Compress(server)
+# Newly published data versions are swapped in between requests, see refresh.py
+refresh.init_app(server)
+# Server-Timing headers and /metrics, disabled with INSTRUMENT=0
+instrument.init_app(server)
+# Precomputed responses of python snapshot.py, disabled with SNAPSHOT=0
+snapshot.init_app(server)
+
+# Load the matches and the aggregate cube at import, in the gunicorn master when the
+# app is preloaded (gunicorn.conf.py) and shared with the forked workers
+store.use_version(store.current_version())
+store.preload()
+cube.get_rollups()
+stats.get_stats()
+elo.get_ratings()
+snapshot.get_snapshot()
 
 # TODO: Constants in a separete file perhaps
 
@@ -42,6 +73,11 @@ CONTENT_STYLE = {
 # colors for graphs
 COLORS = ["mediumseagreen", "indianred", "lightslategray"]
 
+# Largest rolling window of the average points chart, about a season of matchdays
+MAX_WINDOW = 38
+WINDOW_MARKS = [1, 3, 5, 10, 19, 38]
+WINDOW_TYPES = {"simple": "Simple", "exponential": "Exponentially weighted"}
+
 # reorderlist
 REORDERLIST = ["HOME_TEAM", "AWAY_TEAM", "DRAW"]
 
@@ -68,7 +104,7 @@ sidebar = html.Div(
         dbc.FormGroup(
             [
                 dbc.Label("League selection"),
-                dbc.RadioItems(
+                dbc.Checklist(
                     id="leagueselector",
                     options=[
                         {"label": "Premier League", "value": "PL"},
@@ -76,8 +112,9 @@ sidebar = html.Div(
                         {"label": "Eredivisie", "value": "DED"},
                         {"label": "Serie A", "value": "SA"},
                         {"label": "Ligue 1", "value": "FL1"},
+                        {"label": "Primera División", "value": "PD"},
                     ],
-                    value="PL",
+                    value=["PL"],
                     custom=False,
                 ),
             ]
@@ -85,16 +122,15 @@ sidebar = html.Div(
         html.Div(
             dbc.FormGroup(
                 [
-                    # TODO: Think of a way how to combine different seasons/leagues
                     dbc.Label("Year selection"),
-                    dbc.RadioItems(
+                    dbc.Checklist(
                         id="yearselector",
                         options=[
                             {"label": "2018-2019", "value": "2018"},
                             {"label": "2019-2020", "value": "2019"},
                             {"label": "2020-2021", "value": "2020"},
                         ],
-                        value="2020",
+                        value=["2020"],
                         custom=False,
                     ),
                 ]
@@ -103,7 +139,6 @@ sidebar = html.Div(
         ),
         dbc.FormGroup(
             [
-                # TODO: Preprocess the pre and post corona datasets, and think of a way how to combine different seasons/leagues
                 html.Label(
                     "Pick a team to see the amount of home/away wins and draws they have."
                 ),
@@ -154,18 +189,51 @@ content = html.Div(
                     id="double_winner_graph_post",
                     style={"display": "inline-block", "width": "49%"},
                 ),
+                dcc.Markdown(id="double_winner_stats", style={"text-align": "center"}),
             ],
             id="double_winner_div",
         ),
         html.Div(
             [
                 dcc.Markdown(id="avg_points_text", style={"text-align": "center"}),
+                dbc.FormGroup(
+                    [
+                        dbc.Label("Rolling average over matchdays"),
+                        dcc.Slider(
+                            id="windowselector",
+                            min=1,
+                            max=MAX_WINDOW,
+                            step=1,
+                            value=1,
+                            marks={window: str(window) for window in WINDOW_MARKS},
+                        ),
+                        dbc.RadioItems(
+                            id="windowtype",
+                            options=[
+                                {"label": label, "value": value}
+                                for value, label in WINDOW_TYPES.items()
+                            ],
+                            value="simple",
+                            inline=True,
+                        ),
+                    ]
+                ),
                 dcc.Graph(
                     id="avg_points_graph",
                 ),
             ],
             id="avg_points_div",
         ),
+        html.Div(
+            [
+                dcc.Markdown(id="goals_text", style={"text-align": "center"}),
+                dcc.Graph(
+                    id="goals_graph",
+                ),
+                dcc.Markdown(id="goals_table", style={"text-align": "center"}),
+            ],
+            id="goals_div",
+        ),
         html.Div(
             [
                 dcc.Markdown(
@@ -198,62 +266,55 @@ content = html.Div(
     style=CONTENT_STYLE,
 )
 
-app.layout = html.Div([sidebar, content])
 
+def serve_layout():
+    # Built on every page load, the team lists follow the data version in use
+    return html.Div(
+        [
+            sidebar,
+            content,
+            # Team names per league and year, shipped once for the clientside callbacks
+            dcc.Store(id="team_lists", data=team_lists()),
+        ]
+    )
 
-@app.callback(Output("yeardiv", "style"), [Input("prepost_or_year", "value")])
-def toggle_prepost_year(prepost_or_year):
-    if prepost_or_year == "prepost":
-        return {"display": "none"}
-    elif prepost_or_year == "year":
-        return {"display": "block"}
 
+app.layout = serve_layout
 
-@app.callback(
+
+# Visibility toggles and the team dropdown run clientside, see assets/clientside.js
+app.clientside_callback(
+    ClientsideFunction(namespace="sidebar", function_name="toggle_prepost_year"),
+    Output("yeardiv", "style"),
+    [Input("prepost_or_year", "value")],
+)
+
+app.clientside_callback(
+    ClientsideFunction(namespace="sidebar", function_name="set_teamselector_options"),
     Output("teamselector", "options"),
     [
         Input("prepost_or_year", "value"),
         Input("leagueselector", "value"),
         Input("yearselector", "value"),
+        Input("team_lists", "data"),
     ],
 )
-def set_teamselector_options(prepost_or_year, league, year):
-    if prepost_or_year == "prepost":
-        df_pre, df_post = read_data(prepost_or_year, league, year)
-        df = pd.concat([df_pre, df_post])
-    elif prepost_or_year == "year":
-        df = read_data(prepost_or_year, league, year)
 
-    return [
-        {"label": team, "value": team} for team in np.sort(df["homeTeamName"].unique())
-    ]
-
-
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace="sidebar", function_name="update_winner_styles"),
     Output("single_winner_div", "style"),
     Output("double_winner_div", "style"),
     [Input("prepost_or_year", "value")],
 )
-def update_winner_styles(prepost_or_year):
-    if prepost_or_year == "prepost":
-        style_double_winner_div = {"display": "block"}
-        style_single_winner_div = {"display": "none"}
-        return style_single_winner_div, style_double_winner_div
-    elif prepost_or_year == "year":
-        style_single_winner_div = {"display": "block"}
-        style_double_winner_div = {"display": "none"}
-        return style_single_winner_div, style_double_winner_div
-
-
-@app.callback(Output("avg_points_div", "style"), [Input("prepost_or_year", "value")])
-def update_avg_points_style(prepost_or_year):
-    if prepost_or_year == "prepost":
-        return {"display": "block"}
-    elif prepost_or_year == "year":
-        return {"display": "none"}
 
+app.clientside_callback(
+    ClientsideFunction(namespace="sidebar", function_name="update_avg_points_style"),
+    Output("avg_points_div", "style"),
+    [Input("prepost_or_year", "value")],
+)
 
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace="sidebar", function_name="update_teamwinner_styles"),
     Output("single_teamwinner_div", "style"),
     Output("double_teamwinner_div", "style"),
     [
@@ -261,37 +322,9 @@ def update_avg_points_style(prepost_or_year):
         Input("leagueselector", "value"),
         Input("teamselector", "value"),
         Input("yearselector", "value"),
+        Input("team_lists", "data"),
     ],
 )
-def update_teamwinner_styles(prepost_or_year, league, teamname, year):
-    if not teamname:
-        return {"display": "none"}, {"display": "none"}
-
-    if prepost_or_year == "prepost":
-        # Below 5 lines are for making the team graph disappear when changing leagues
-        df_pre, df_post = read_data(prepost_or_year, league, year)
-        df = pd.concat([df_pre, df_post])
-        all_teams = np.sort(
-            df["homeTeamName"].unique()
-        )  # Assuming all teams have played home at least once
-        if teamname not in all_teams:
-            return {"display": "none"}, {"display": "none"}
-
-        style_double_teamwinner_div = {"display": "block"}
-        style_single_teamwinner_div = {"display": "none"}
-        return style_single_teamwinner_div, style_double_teamwinner_div
-    elif prepost_or_year == "year":
-        # Below 5 lines are for making the team graph disappear when changing leagues
-        df = read_data(prepost_or_year, league, year)
-        all_teams = np.sort(
-            df["homeTeamName"].unique()
-        )  # Assuming all teams have played home at least once
-        if teamname not in all_teams:
-            return {"display": "none"}, {"display": "none"}
-
-        style_single_teamwinner_div = {"display": "block"}
-        style_double_teamwinner_div = {"display": "none"}
-        return style_single_teamwinner_div, style_double_teamwinner_div
 
 
 @app.callback(
@@ -303,29 +336,23 @@ def update_teamwinner_styles(prepost_or_year, league, teamname, year):
         Input("yearselector", "value"),
     ],
 )
-def update_single_winner_graph(prepost_or_year, league, year):
+@instrument.timed
+@figcache.cached
+def update_single_winner_graph(prepost_or_year, leagues, years):
     if prepost_or_year == "prepost":
         raise PreventUpdate
 
-    df = read_data(prepost_or_year, league, year)
-    df_winner = (
-        df["winner"]
-        .value_counts()
-        .reindex(REORDERLIST)
-        .rename_axis("Winning team")
-        .reset_index(name="Counts")
-    )
-    fig = go.Figure(
-        data=[
-            go.Bar(
-                x=df_winner["Winning team"], y=df_winner["Counts"], marker_color=COLORS
-            )
-        ]
-    )
+    if not leagues or not years:
+        return {}, ""
 
-    update_axes(fig)
+    winners = cube.winner_counts(leagues, years=[int(year) for year in years]).reindex(
+        REORDERLIST
+    )
+    fig = outcome_figure(winners, COLORS)
 
-    winner_text = f"## Total number of home wins, draws and away wins in the {league}"
+    winner_text = (
+        f"## Total number of home wins, draws and away wins in the {', '.join(leagues)}"
+    )
 
     return fig, winner_text
 
@@ -334,57 +361,39 @@ def update_single_winner_graph(prepost_or_year, league, year):
     Output("double_winner_graph_pre", "figure"),
     Output("double_winner_graph_post", "figure"),
     Output("double_winner_text", "children"),
+    Output("double_winner_stats", "children"),
     [
         Input("prepost_or_year", "value"),
         Input("leagueselector", "value"),
         Input("yearselector", "value"),
     ],
 )
-def update_double_winner_graph(prepost_or_year, league, year):
+@instrument.timed
+@figcache.cached
+def update_double_winner_graph(prepost_or_year, leagues, years):
     if prepost_or_year == "year":
         raise PreventUpdate
 
-    df_pre, df_post = read_data(prepost_or_year, league, year)
-    df_winner_pre = (
-        df_pre["winner"]
-        .value_counts()
-        .reindex(REORDERLIST)
-        .rename_axis("Winning team")
-        .reset_index(name="Counts")
-    )
-    df_winner_post = (
-        df_post["winner"]
-        .value_counts()
-        .reindex(REORDERLIST)
-        .rename_axis("Winning team")
-        .reset_index(name="Counts")
-    )
+    if not leagues:
+        return {}, {}, "", ""
 
-    fig_pre = go.Figure(
-        data=[
-            go.Bar(
-                x=df_winner_pre["Winning team"],
-                y=df_winner_pre["Counts"],
-                marker_color=COLORS,
-            )
-        ]
+    fig_pre = outcome_figure(
+        cube.winner_counts(leagues, corona="pre").reindex(REORDERLIST), COLORS
     )
-    fig_post = go.Figure(
-        data=[
-            go.Bar(
-                x=df_winner_post["Winning team"],
-                y=df_winner_post["Counts"],
-                marker_color=COLORS,
-            )
-        ]
+    fig_post = outcome_figure(
+        cube.winner_counts(leagues, corona="post").reindex(REORDERLIST), COLORS
     )
 
-    update_axes(fig_pre)
-    update_axes(fig_post)
+    winner_text = f"## Total number of home wins, draws and away wins in the {', '.join(leagues)} before and after corona."
 
-    winner_text = f"## Total number of home wins, draws and away wins in the {league} before and after corona."
+    # Is the difference real: bootstrap intervals and a permutation test
+    stats_text = stats.summary_table(stats.selection_stats(tuple(sorted(leagues))))
+    # Home advantage net of team strength, from the pre-game ratings
+    elo_text = elo.summary_text(tuple(sorted(leagues)))
+    if elo_text:
+        stats_text = f"{stats_text}\n\n{elo_text}"
 
-    return fig_pre, fig_post, winner_text
+    return fig_pre, fig_post, winner_text, stats_text
 
 
 @app.callback(
@@ -394,169 +403,103 @@ def update_double_winner_graph(prepost_or_year, league, year):
         Input("prepost_or_year", "value"),
         Input("leagueselector", "value"),
         Input("yearselector", "value"),
+        Input("windowselector", "value"),
+        Input("windowtype", "value"),
     ],
 )
-def update_avg_points_graph(prepost_or_year, league, year):
+@instrument.timed
+@figcache.cached
+def update_avg_points_graph(prepost_or_year, leagues, years, window, window_type):
     if prepost_or_year == "year":
         raise PreventUpdate
 
-    df_pre, df_post = read_data(prepost_or_year, league, year)
-    df_pre = preprocess_avg_points(df_pre)
-    df_post = preprocess_avg_points(df_post)
+    if not leagues:
+        return {}, ""
 
-    # Fix for weird cases where matches from earlier match days were played in post corona time
-    df_post = df_post[~df_post["yearMatchday"].isin(df_pre["yearMatchday"].unique())]
+    points_df_pre, points_df_post = points_series(leagues)
 
-    points_df_pre = pd.DataFrame(
-        0,
-        index=df_pre["yearMatchday"].unique(),
-        columns=["homeTeamPoints", "awayTeamPoints", "numberOfMatches"],
-    )
-    points_df_post = pd.DataFrame(
-        0,
-        index=df_post["yearMatchday"].unique(),
-        columns=["homeTeamPoints", "awayTeamPoints", "numberOfMatches"],
-    )
+    # Same colors for a venue before (light) and after (dark) corona, the legend
+    # shows and hides the traces in the browser
+    data = [
+        line_trace(
+            points_df.index,
+            rolling_points(points_df, venue, window, window_type),
+            name=f"Average {venue} team points {period} corona",
+            line=dict(color=color),
+        )
+        for points_df, period, colors in [
+            (points_df_pre, "before", ["mediumseagreen", "indianred"]),
+            (points_df_post, "after", ["seagreen", "firebrick"]),
+        ]
+        for venue, color in zip(["home", "away"], colors)
+    ]
 
-    points_df_pre = fill_points_df(df_pre, points_df_pre)
-    points_df_post = fill_points_df(df_post, points_df_post)
+    fig = figure(data, "Year and matchday", "Points", showlegend=True)
 
-    trace1_1 = go.Scatter(
-        x=points_df_pre.index,
-        y=points_df_pre["homeAvgPoints"],
-        mode="lines",
-        name="Average home team points before corona",
-        line=dict(color="mediumseagreen"),
-    )
-    trace1_2 = go.Scatter(
-        x=points_df_pre.index,
-        y=points_df_pre["awayAvgPoints"],
-        mode="lines",
-        name="Average away team points before corona",
-        line=dict(color="indianred"),
-    )
-    trace1_3 = go.Scatter(
-        x=points_df_post.index,
-        y=points_df_post["homeAvgPoints"],
-        mode="lines",
-        name="Average home team points after corona",
-        line=dict(color="seagreen"),
-    )
-    trace1_4 = go.Scatter(
-        x=points_df_post.index,
-        y=points_df_post["awayAvgPoints"],
-        mode="lines",
-        name="Average away team points after corona",
-        line=dict(color="firebrick"),
-    )
+    text = f"## Average points for home and away teams in the {', '.join(leagues)}"
 
-    trace2_1 = go.Scatter(
-        x=points_df_pre.index,
-        y=points_df_pre["maHomePoints"],
-        mode="lines",
-        name="Average home team points before corona",
-        line=dict(color="mediumseagreen"),
-        visible=False,
-    )
-    trace2_2 = go.Scatter(
-        x=points_df_pre.index,
-        y=points_df_pre["maAwayPoints"],
-        mode="lines",
-        name="Average away team points before corona",
-        line=dict(color="indianred"),
-        visible=False,
-    )
-    trace2_3 = go.Scatter(
-        x=points_df_post.index,
-        y=points_df_post["maHomePoints"],
-        mode="lines",
-        name="Average home team points after corona",
-        line=dict(color="seagreen"),
-        visible=False,
-    )
-    trace2_4 = go.Scatter(
-        x=points_df_post.index,
-        y=points_df_post["maAwayPoints"],
-        mode="lines",
-        name="Average away team points after corona",
-        line=dict(color="firebrick"),
-        visible=False,
-    )
+    return fig, text
 
-    data = [
-        trace1_1,
-        trace1_2,
-        trace1_3,
-        trace1_4,
-        trace2_1,
-        trace2_2,
-        trace2_3,
-        trace2_4,
-    ]
 
-    updatemenus = list(
+@app.callback(
+    Output("goals_graph", "figure"),
+    Output("goals_text", "children"),
+    Output("goals_table", "children"),
+    [
+        Input("prepost_or_year", "value"),
+        Input("leagueselector", "value"),
+        Input("yearselector", "value"),
+    ],
+)
+@instrument.timed
+@figcache.cached
+def update_goals_graph(prepost_or_year, leagues, years):
+    if not leagues or (prepost_or_year == "year" and not years):
+        return {}, "", ""
+
+    if prepost_or_year == "prepost":
+        selections = {
+            "before corona": dict(corona="pre"),
+            "after corona": dict(corona="post"),
+        }
+    else:
+        selections = {"": dict(years=[int(year) for year in years])}
+
+    totals = pd.DataFrame(
+        {
+            period: cube.goal_totals(leagues, **selection)
+            for period, selection in selections.items()
+        }
+    ).T
+    metrics = goal_metrics(totals)
+
+    winners = pd.DataFrame(
+        {
+            period: cube.winner_counts(leagues, **selection)
+            for period, selection in selections.items()
+        }
+    ).T
+    home_points = (3 * winners["HOME_TEAM"] + winners["DRAW"]) / winners.sum(axis=1)
+
+    fig = figure(
         [
-            dict(
-                active=0,
-                showactive=True,
-                x=0.57,
-                y=1.2,
-                buttons=list(
-                    [
-                        dict(
-                            label="Average per matchday",
-                            method="update",
-                            args=[
-                                {
-                                    "visible": [
-                                        True,
-                                        True,
-                                        True,
-                                        True,
-                                        False,
-                                        False,
-                                        False,
-                                        False,
-                                    ]
-                                }
-                            ],
-                        ),
-                        dict(
-                            label="Rolling average over 3 matchdays",
-                            method="update",
-                            args=[
-                                {
-                                    "visible": [
-                                        False,
-                                        False,
-                                        False,
-                                        False,
-                                        True,
-                                        True,
-                                        True,
-                                        True,
-                                    ]
-                                }
-                            ],
-                        ),
-                    ]
-                ),
+            bar_trace(
+                ["Home goals", "Away goals", "Goal difference"],
+                metrics.loc[
+                    (time, period), ["homeGoals", "awayGoals", "goalDifference"]
+                ],
+                name=f"{time}, {period}" if period else time,
             )
-        ]
+            for time, period in metrics.index
+        ],
+        "Goals per match",
+        "Goals",
+        barmode="group",
     )
 
-    layout = dict(
-        showlegend=True,
-        xaxis=dict(title="Year and matchday"),
-        yaxis=dict(title="Points"),
-        updatemenus=updatemenus,
-    )
-
-    fig = dict(data=data, layout=layout)
+    text = f"## Goals and expected home advantage in the {', '.join(leagues)}"
 
-    text = f"## Average points for home and away teams in the {league}"
-
-    return fig, text
+    return fig, text, goals_table(metrics, home_points)
 
 
 @app.callback(
@@ -569,36 +512,22 @@ def update_avg_points_graph(prepost_or_year, league, year):
         Input("teamselector", "value"),
     ],
 )
-def update_single_teamwinner_graph(prepost_or_year, league, year, teamname):
+@instrument.timed
+@figcache.cached
+def update_single_teamwinner_graph(prepost_or_year, leagues, years, teamname):
     if prepost_or_year == "prepost":
         raise PreventUpdate
-    elif prepost_or_year == "year":
-        df = read_data(prepost_or_year, league, year)
 
-    all_teams = np.sort(
-        df["homeTeamName"].unique()
-    )  # Assuming all teams have played home at least once
+    all_teams = team_names(prepost_or_year, leagues, years)
 
     if teamname not in all_teams:
         return {}, ""
 
-    dff = df[["winner", "homeTeamName", "awayTeamName"]]
-    df_teams = pd.DataFrame(
-        0, index=["HOME_TEAM", "AWAY_TEAM", "DRAW"], columns=list(all_teams)
-    )
-    df_teams = fill_df_teams(dff, df_teams)
-
-    teamwinner_graph = go.Figure(
-        data=[
-            go.Bar(
-                x=df_teams[teamname].index,
-                y=df_teams[teamname].tolist(),
-                marker_color=COLORS,
-            )
-        ]
+    df_teams = cube.team_outcomes(
+        leagues, years=[int(year) for year in years], teams=list(all_teams)
     )
 
-    update_axes(teamwinner_graph)
+    teamwinner_graph = outcome_figure(df_teams[teamname], COLORS)
 
     teamwinner_text = f"### Home wins, draws and away wins for {teamname}"
 
@@ -616,57 +545,25 @@ def update_single_teamwinner_graph(prepost_or_year, league, year, teamname):
         Input("teamselector", "value"),
     ],
 )
-def update_double_teamwinner_graph(prepost_or_year, league, year, teamname):
+@instrument.timed
+@figcache.cached
+def update_double_teamwinner_graph(prepost_or_year, leagues, years, teamname):
     if prepost_or_year == "year":
         raise PreventUpdate
-    elif prepost_or_year == "prepost":
-        df_pre, df_post = read_data(prepost_or_year, league, year)
-        df = pd.concat([df_pre, df_post])
 
-    all_teams = np.sort(
-        df["homeTeamName"].unique()
-    )  # Assuming all teams have played home at least once
+    all_teams = team_names(prepost_or_year, leagues, years)
 
     if teamname not in all_teams:
         return {}, {}, ""
 
-    all_teams_pre = np.sort(df_pre["homeTeamName"].unique())
-    dff_pre = df_pre[["winner", "homeTeamName", "awayTeamName"]]
-    df_teams_pre = pd.DataFrame(
-        0, index=["HOME_TEAM", "AWAY_TEAM", "DRAW"], columns=list(all_teams_pre)
-    )
-    df_teams_pre = fill_df_teams(dff_pre, df_teams_pre)
-
-    teamwinner_graph_pre = go.Figure(
-        data=[
-            go.Bar(
-                x=df_teams_pre[teamname].index,
-                y=df_teams_pre[teamname].tolist(),
-                marker_color=COLORS,
-            )
-        ]
-    )
+    # Counted over all teams, so a team that only played before or after corona gets zeros
+    df_teams_pre = cube.team_outcomes(leagues, corona="pre", teams=list(all_teams))
 
-    update_axes(teamwinner_graph_pre)
+    teamwinner_graph_pre = outcome_figure(df_teams_pre[teamname], COLORS)
 
-    all_teams_post = np.sort(df_post["homeTeamName"].unique())
-    dff_post = df_post[["winner", "homeTeamName", "awayTeamName"]]
-    df_teams_post = pd.DataFrame(
-        0, index=["HOME_TEAM", "AWAY_TEAM", "DRAW"], columns=list(all_teams_post)
-    )
-    df_teams_post = fill_df_teams(dff_post, df_teams_post)
-
-    teamwinner_graph_post = go.Figure(
-        data=[
-            go.Bar(
-                x=df_teams_post[teamname].index,
-                y=df_teams_post[teamname].tolist(),
-                marker_color=COLORS,
-            )
-        ]
-    )
+    df_teams_post = cube.team_outcomes(leagues, corona="post", teams=list(all_teams))
 
-    update_axes(teamwinner_graph_post)
+    teamwinner_graph_post = outcome_figure(df_teams_post[teamname], COLORS)
 
     double_teamwinner_text = f"### Home wins, draws and away wins for {teamname}"
 
@@ -0,0 +1,57 @@
+// Sidebar callbacks that only toggle visibility or filter the team dropdown,
+// they run in the browser so they never cost a request to the server.
+function selectedTeams(team_lists, prepost_or_year, leagues, years) {
+    // Union of the teams of every selected league and season
+    var keys = prepost_or_year === "prepost" ? ["prepost"] : years || [];
+    var teams = {};
+    (leagues || []).forEach(function (league) {
+        var lists = team_lists[league] || {};
+        keys.forEach(function (key) {
+            (lists[key] || []).forEach(function (team) {
+                teams[team] = true;
+            });
+        });
+    });
+    return Object.keys(teams).sort();
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    sidebar: {
+        toggle_prepost_year: function (prepost_or_year) {
+            return {display: prepost_or_year === "prepost" ? "none" : "block"};
+        },
+
+        set_teamselector_options: function (prepost_or_year, leagues, years, team_lists) {
+            return selectedTeams(team_lists, prepost_or_year, leagues, years).map(
+                function (team) {
+                    return {label: team, value: team};
+                }
+            );
+        },
+
+        update_winner_styles: function (prepost_or_year) {
+            var prepost = prepost_or_year === "prepost";
+            return [
+                {display: prepost ? "none" : "block"},
+                {display: prepost ? "block" : "none"},
+            ];
+        },
+
+        update_avg_points_style: function (prepost_or_year) {
+            return {display: prepost_or_year === "prepost" ? "block" : "none"};
+        },
+
+        update_teamwinner_styles: function (prepost_or_year, leagues, teamname, years, team_lists) {
+            // Make the team graph disappear when changing leagues
+            var teams = selectedTeams(team_lists, prepost_or_year, leagues, years);
+            if (!teamname || teams.indexOf(teamname) === -1) {
+                return [{display: "none"}, {display: "none"}];
+            }
+            var prepost = prepost_or_year === "prepost";
+            return [
+                {display: prepost ? "none" : "block"},
+                {display: prepost ? "block" : "none"},
+            ];
+        },
+    },
+});
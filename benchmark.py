@@ -0,0 +1,330 @@
+import argparse
+import importlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+import cube
+import figcache
+import functions
+import schema
+import store
+import synthetic
+
+# One line per measurement, appended by every run
+RESULTS_PATH = "benchmarks.jsonl"
+
+# Multiples of the current data volume
+SCALES = [1, 10, 100]
+
+REPEAT = 5
+
+# Content codings the payload report asks for, see Flask-Compress in app.py
+ENCODINGS = ["identity", "gzip", "br"]
+
+# Medians this much slower than on the previous commit are reported
+REGRESSION_THRESHOLD = 1.2
+
+
+def measure(func, setup=None, repeat=REPEAT):
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def clear_caches():
+    # Cold queries: the partitions and the cube rollups stay loaded, like in a worker
+    functions.clear_query_cache()
+    figcache.clear()
+
+
+def queries():
+    # Every (mode, league, year) the sidebar can ask for
+    keys = store.partition_keys()
+    for league in sorted({league for league, _ in keys}):
+        years = [str(year) for key_league, year in keys if key_league == league]
+        # The year selector keeps its value while it is hidden in prepost mode
+        yield "prepost", league, years[-1]
+        for year in years:
+            yield "year", league, year
+
+
+def output_spec(output):
+    # Callbacks with several outputs are keyed as ..id.prop...id.prop..
+    if output.startswith(".."):
+        return [
+            dict(zip(("id", "property"), part.rsplit(".", 1)))
+            for part in output[2:-2].split("...")
+        ]
+    return dict(zip(("id", "property"), output.rsplit(".", 1)))
+
+
+def callback_payload(output, inputs, values):
+    # Body of the POST the Dash renderer sends to /_dash-update-component
+    return {
+        "output": output,
+        "outputs": output_spec(output),
+        "inputs": [dict(spec, value=values.get(spec["id"])) for spec in inputs],
+        "changedPropIds": [f"{spec['id']}.{spec['property']}" for spec in inputs],
+        "state": [],
+    }
+
+
+def server_callbacks(app):
+    # Clientside callbacks have no Python function and never reach the server
+    return [output for output, spec in app.callback_map.items() if "callback" in spec]
+
+
+def sidebar_values(prepost_or_year, league, year):
+    teams = functions.team_names(prepost_or_year, [league], [year])
+    return {
+        "prepost_or_year": prepost_or_year,
+        "leagueselector": [league],
+        "yearselector": [year],
+        "teamselector": teams[0] if teams else None,
+        "windowselector": 3,
+        "windowtype": "simple",
+    }
+
+
+def check_points_series():
+    # A combined selection has the matches of its single leagues, no more, no less
+    leagues = sorted({league for league, _ in store.partition_keys()})
+    for combined, *single in zip(
+        functions.points_series(leagues),
+        *[functions.points_series([league]) for league in leagues],
+    ):
+        total = sum(points_df["numberOfMatches"].sum() for points_df in single)
+        assert combined["numberOfMatches"].sum() == total, (leagues, total)
+
+
+def run_scale(app, repeat):
+    client = app.server.test_client()
+    results = []
+
+    def record(name, times, params=None):
+        results.append(
+            {
+                "name": name,
+                "params": params,
+                "min": min(times),
+                "median": statistics.median(times),
+                "times": times,
+            }
+        )
+
+    def startup():
+        store.reload()
+        store.preload()
+        cube.get_rollups()
+
+    record("startup", measure(startup, repeat=repeat))
+    check_points_series()
+    matches = schema.concat(
+        [store.get_partition(*key) for key in store.partition_keys()]
+    )
+    record("build_cube", measure(lambda: cube.build_cube(matches), repeat=repeat))
+
+    for query in queries():
+        params = list(query)
+        prepost_or_year, league, year = query
+        record(
+            "team_names",
+            measure(
+                lambda: functions.team_names(prepost_or_year, [league], [year]),
+                clear_caches,
+                repeat,
+            ),
+            params,
+        )
+        if prepost_or_year == "prepost":
+            points_df = cube.matchday_points([league], corona="pre")
+        else:
+            points_df = cube.matchday_points([league], years=[int(year)])
+        record(
+            "fill_points_df",
+            measure(lambda: functions.fill_points_df(points_df), repeat=repeat),
+            params,
+        )
+
+        values = sidebar_values(*query)
+        for output in server_callbacks(app):
+            inputs = app.callback_map[output]["inputs"]
+            payload = callback_payload(output, inputs, values)
+
+            def request():
+                response = client.post("/_dash-update-component", json=payload)
+                assert response.status_code in (200, 204), response.status_code
+                return response.status_code
+
+            clear_caches()
+            # PreventUpdate: this output is not shown in this mode
+            if request() == 204:
+                continue
+            name = "callback:" + output.strip(".").split(".")[0]
+            record(name, measure(request, clear_caches, repeat), params)
+            record(name + ":cached", measure(request, repeat=repeat), params)
+
+    return results
+
+
+def payload_sizes(app):
+    # Response bytes per callback output as sent over the wire for every encoding
+    client = app.server.test_client()
+    rows = []
+    for query in queries():
+        values = sidebar_values(*query)
+        for output in server_callbacks(app):
+            inputs = app.callback_map[output]["inputs"]
+            payload = callback_payload(output, inputs, values)
+            row = {"output": output.strip(".").split(".")[0]}
+            for encoding in ENCODINGS:
+                response = client.post(
+                    "/_dash-update-component",
+                    json=payload,
+                    headers={"Accept-Encoding": encoding},
+                )
+                if response.status_code == 204:
+                    break
+                row[encoding] = len(response.get_data())
+                # Small responses (COMPRESS_MIN_SIZE) are sent as they are
+                row[f"{encoding}Encoded"] = (
+                    response.headers.get("Content-Encoding", "identity") == encoding
+                )
+            else:
+                rows.append(row)
+
+    df = pd.DataFrame(rows)
+    summary = df.groupby("output", sort=False)[ENCODINGS].median()
+    summary["compressed"] = (
+        df.groupby("output", sort=False)[
+            [f"{encoding}Encoded" for encoding in ENCODINGS[1:]]
+        ]
+        .mean()
+        .min(axis=1)
+    )
+    return summary
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return commit + ("-dirty" if dirty else "")
+
+
+def run(scales, repeat, results_path):
+    results_path = os.path.abspath(results_path)
+    run_info = {
+        "commit": git_commit(),
+        "date": pd.Timestamp.utcnow().isoformat(),
+        "machine": platform.node(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+    }
+    cwd = os.getcwd()
+    app = None
+    for scale in scales:
+        with tempfile.TemporaryDirectory() as directory:
+            n_matches = synthetic.generate(directory, scale)
+            print(f"scale {scale}x: {n_matches} matches", file=sys.stderr)
+            # Module paths are relative, the app reads the synthetic data from here
+            os.chdir(directory)
+            try:
+                if app is None:
+                    app = importlib.import_module("app").app
+                results = run_scale(app, repeat)
+            finally:
+                os.chdir(cwd)
+                store.reload()
+
+        with open(results_path, "a") as f:
+            for result in results:
+                f.write(json.dumps(dict(run_info, scale=scale, **result)) + "\n")
+        summarize(results, scale)
+
+
+def summarize(results, scale):
+    df = pd.DataFrame(results)
+    summary = df.groupby("name", sort=False)["median"].agg(["count", "median", "max"])
+    print(f"\nscale {scale}x, median over queries in ms")
+    print((summary * [1, 1000, 1000]).round(2).to_string())
+
+
+def compare(results_path, threshold=REGRESSION_THRESHOLD):
+    # Latest run of every commit on this machine, newest against the one before
+    df = pd.read_json(results_path, lines=True)
+    df = df[df["machine"] == platform.node()]
+    df["params"] = df["params"].map(lambda params: "/".join(map(str, params or [])))
+    commits = df.drop_duplicates("commit", keep="last").sort_values("date")["commit"]
+    if len(commits) < 2:
+        print("Nothing to compare, run the benchmarks on another commit first")
+        return
+
+    key = ["scale", "name", "params"]
+    old, new = [
+        df[df["commit"] == commit].drop_duplicates(key, keep="last").set_index(key)
+        for commit in commits.iloc[-2:]
+    ]
+    ratio = (new["median"] / old["median"]).dropna()
+    print(f"{commits.iloc[-1]} against {commits.iloc[-2]}, median time ratio")
+    print(ratio.groupby(level=["scale", "name"]).median().round(2).to_string())
+
+    regressions = ratio[ratio > threshold].sort_values(ascending=False)
+    if not regressions.empty:
+        print(f"\n{len(regressions)} benchmarks slower than {threshold}x")
+        print(regressions.round(2).to_string())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the query, aggregation and callback hot paths "
+        "on synthetic data"
+    )
+    parser.add_argument("--scales", type=int, nargs="+", default=SCALES)
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--results", default=RESULTS_PATH)
+    parser.add_argument(
+        "--compare",
+        action="store_true",
+        help="only compare the stored results of the last two commits",
+    )
+    parser.add_argument(
+        "--payload",
+        action="store_true",
+        help="only report the response bytes per callback on the data in data/",
+    )
+    args = parser.parse_args()
+    if args.compare:
+        compare(args.results)
+    elif args.payload:
+        summary = payload_sizes(importlib.import_module("app").app)
+        print("median response bytes per callback, share of compressed responses")
+        print(summary.round(2).to_string())
+    else:
+        run(args.scales, args.repeat, args.results)
+        compare(args.results)
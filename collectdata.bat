@@ -1,5 +1,5 @@
 call conda activate soccer
 set Pathname="D:\Rens\Hobby\football-away-games-corona\football-away-games-corona"
 cd /d %Pathname%
-"D:\Aanaconda3\envs\soccer\python.exe" "D:\Rens\Hobby\football-away-games-corona\football-away-games-corona\data.py"
+"D:\Aanaconda3\envs\soccer\python.exe" "D:\Rens\Hobby\football-away-games-corona\football-away-games-corona\refresh.py"
 pause
\ No newline at end of file
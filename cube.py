@@ -0,0 +1,261 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow.feather as feather
+
+import instrument
+import schema
+import store
+from schema import OUTCOMES
+
+CUBE_PATH = "data/cube.feather"
+
+DIMENSIONS = ["league", "year", "corona", "matchday", "team", "venue", "outcome"]
+
+# Summed goals of a selection, see goal_totals
+GOAL_TOTALS = ["matches", "homeGoals", "awayGoals", "homeGoalsHT", "awayGoalsHT"]
+
+_lock = threading.Lock()
+_rollups = None
+
+
+def build_cube(df):
+    # One row per team per match, then summed over every dimension
+    df = df.dropna(subset=["matchday"])
+    winner = df["winner"].to_numpy()
+    sides = []
+    for venue, team_col, win, side, other in [
+        ("home", "homeTeamName", "HOME_TEAM", "home", "away"),
+        ("away", "awayTeamName", "AWAY_TEAM", "away", "home"),
+    ]:
+        sides.append(
+            pd.DataFrame(
+                {
+                    "league": df["league"].to_numpy(),
+                    "year": df["year"].to_numpy(),
+                    "corona": df["corona"].to_numpy(),
+                    "matchday": df["matchday"].to_numpy().astype(int),
+                    "team": df[team_col].to_numpy(),
+                    "venue": venue,
+                    "outcome": winner,
+                    "matches": 1,
+                    "points": np.select([winner == win, winner == "DRAW"], [3, 1], 0),
+                    "goalsFor": df[f"{side}GoalsFT"].to_numpy(),
+                    "goalsAgainst": df[f"{other}GoalsFT"].to_numpy(),
+                    "goalsForHT": df[f"{side}GoalsHT"].to_numpy(),
+                    "goalsAgainstHT": df[f"{other}GoalsHT"].to_numpy(),
+                    "firstPlayed": df["utcDate"].to_numpy(),
+                }
+            )
+        )
+
+    cube = (
+        pd.concat(sides, ignore_index=True)
+        .groupby(DIMENSIONS, sort=False)
+        .agg(
+            matches=("matches", "sum"),
+            points=("points", "sum"),
+            goalsFor=("goalsFor", "sum"),
+            goalsAgainst=("goalsAgainst", "sum"),
+            goalsForHT=("goalsForHT", "sum"),
+            goalsAgainstHT=("goalsAgainstHT", "sum"),
+            firstPlayed=("firstPlayed", "min"),
+        )
+        .reset_index()
+    )
+    return schema.apply_schema(cube, schema.CUBE_SCHEMA)
+
+
+def write_cube(cube, path=CUBE_PATH):
+    store.write_feather(cube, path)
+
+
+def read_cube(root=None):
+    path = store.data_path(CUBE_PATH, root)
+    if not os.path.exists(path):
+        # No cube from data.py yet, build it from the match partitions
+        data_dir = store.data_path(store.DATA_DIR, root)
+        matches = schema.concat(
+            [
+                store.read_partition(
+                    league, year, columns=store.COLUMNS, data_dir=data_dir
+                )
+                for league, year in store.list_partitions(data_dir)
+            ]
+        )
+        return build_cube(matches)
+    return feather.read_table(path, memory_map=True).to_pandas()
+
+
+def rollup(part):
+    home = part[part["venue"] == "home"]
+    winners = home.groupby("outcome")["matches"].sum().reindex(OUTCOMES, fill_value=0)
+
+    # Home wins at home, away wins away and every draw, per team
+    own_outcome = np.where(part["venue"] == "home", "HOME_TEAM", "AWAY_TEAM")
+    counted = part[(part["outcome"] == own_outcome) | (part["outcome"] == "DRAW")]
+    teams = (
+        counted.pivot_table(
+            index="outcome",
+            columns="team",
+            values="matches",
+            aggfunc="sum",
+            observed=True,
+        )
+        .reindex(index=OUTCOMES, columns=np.sort(part["team"].unique()))
+        .fillna(0)
+        .astype(int)
+    )
+
+    matchdays = (
+        pd.DataFrame(
+            {
+                "year": home["year"].to_numpy().astype(int),
+                "matchday": home["matchday"].to_numpy().astype(int),
+                "homeTeamPoints": np.where(
+                    home["outcome"] == "HOME_TEAM", 3 * home["matches"], 0
+                ),
+                "awayTeamPoints": np.where(
+                    home["outcome"] == "AWAY_TEAM", 3 * home["matches"], 0
+                ),
+                "numberOfMatches": home["matches"].to_numpy(),
+                "firstPlayed": home["firstPlayed"].to_numpy(),
+            }
+        )
+        .groupby(["year", "matchday"])
+        .agg(
+            homeTeamPoints=("homeTeamPoints", "sum"),
+            awayTeamPoints=("awayTeamPoints", "sum"),
+            numberOfMatches=("numberOfMatches", "sum"),
+            firstPlayed=("firstPlayed", "min"),
+        )
+    )
+
+    # Goals of the home and the away teams, every match counted once from the home row
+    goals = (
+        home[["matches", "goalsFor", "goalsAgainst", "goalsForHT", "goalsAgainstHT"]]
+        .sum()
+        .set_axis(GOAL_TOTALS)
+    )
+
+    return {
+        "winners": winners,
+        "teams": teams,
+        "matchdays": matchdays,
+        "goals": goals,
+    }
+
+
+def build_rollups(cube):
+    rollups = {
+        key: rollup(part)
+        for key, part in cube.groupby(["league", "year", "corona"], observed=True)
+    }
+    # Matchdays begun before corona and finished after it, per league and season: the
+    # matchday numbers of different leagues are unrelated
+    for (league, year, corona), part in rollups.items():
+        pre = rollups.get((league, year, "pre")) if corona == "post" else None
+        matchdays = part["matchdays"]
+        if pre is not None:
+            matchdays = matchdays[~matchdays.index.isin(pre["matchdays"].index)]
+        part["newMatchdays"] = matchdays
+    return rollups
+
+
+def get_rollups():
+    global _rollups
+    if _rollups is None:
+        with _lock:
+            if _rollups is None:
+                _rollups = build_rollups(read_cube())
+    return _rollups
+
+
+@store.on_reload
+def clear_rollups():
+    global _rollups
+    with _lock:
+        _rollups = None
+
+
+@store.on_load
+def load_rollups(root):
+    rollups = build_rollups(read_cube(root))
+
+    def install():
+        global _rollups
+        with _lock:
+            _rollups = rollups
+
+    return install
+
+
+def select(leagues, years=None, corona=None):
+    # Rollups of every selected partition, combined selections sum these
+    return [
+        rollups
+        for (league, year, key_corona), rollups in get_rollups().items()
+        if league in leagues
+        and (years is None or year in years)
+        and (corona is None or key_corona == corona)
+    ]
+
+
+@instrument.timed
+def winner_counts(leagues, years=None, corona=None):
+    counts = pd.Series(0, index=OUTCOMES)
+    for rollups in select(leagues, years, corona):
+        counts += rollups["winners"]
+        instrument.scanned(len(rollups["winners"]))
+    return counts
+
+
+@instrument.timed
+def goal_totals(leagues, years=None, corona=None):
+    totals = pd.Series(0, index=GOAL_TOTALS)
+    for rollups in select(leagues, years, corona):
+        totals += rollups["goals"]
+        instrument.scanned(len(rollups["goals"]))
+    return totals
+
+
+@instrument.timed
+def team_outcomes(leagues, years=None, corona=None, teams=None):
+    frames = [rollups["teams"] for rollups in select(leagues, years, corona)]
+    # One row per team and partition once transposed
+    instrument.scanned(sum(frame.shape[1] for frame in frames))
+    if not frames:
+        df_teams = pd.DataFrame(index=OUTCOMES)
+    else:
+        df_teams = pd.concat([frame.T for frame in frames]).groupby(level=0).sum().T
+    if teams is not None:
+        df_teams = df_teams.reindex(columns=teams, fill_value=0)
+    return df_teams
+
+
+@instrument.timed
+def matchday_points(leagues, years=None, corona=None, new_only=False):
+    # new_only leaves out the post corona matches of matchdays begun before corona
+    column = "newMatchdays" if new_only else "matchdays"
+    frames = [rollups[column] for rollups in select(leagues, years, corona)]
+    instrument.scanned(sum(len(frame) for frame in frames))
+    if not frames:
+        return pd.DataFrame(
+            columns=["homeTeamPoints", "awayTeamPoints", "numberOfMatches"]
+        )
+    # Matchdays of several leagues are added up
+    points_df = (
+        pd.concat(frames)
+        .groupby(level=["year", "matchday"])
+        .agg(
+            homeTeamPoints=("homeTeamPoints", "sum"),
+            awayTeamPoints=("awayTeamPoints", "sum"),
+            numberOfMatches=("numberOfMatches", "sum"),
+            firstPlayed=("firstPlayed", "min"),
+        )
+    )
+    # Matchdays in the order they were first played, like the match rows sorted by date
+    points_df = points_df.sort_values("firstPlayed", kind="mergesort")
+    return points_df.drop(columns="firstPlayed")
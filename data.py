@@ -1,133 +1,147 @@
-import http.client
-import json
 import os
+import sys
 import pandas as pd
-import time
 import numpy as np
 
+import api
+import cube
+import elo
+import schema
+import snapshot
+import stats
+import store
+
 API_SOCCER = os.environ.get("API_SOCCER")
-connection = http.client.HTTPConnection("api.football-data.org")
-headers = {"X-Auth-Token": API_SOCCER}
-
-# Eredivisie, Premier League, Bundesliga, Ligue 1, Serie A, Primera Divison
-competitions = ["DED", "PL", "BL1", "FL1", "SA", "PD"]
-seasons = [2018, 2019, 2020]
-
-# Retrieving the data
-for comp in competitions:
-    for season in seasons:
-        connection.request(
-            "GET",
-            f"/v2/competitions/{comp}/matches?season={season}&status=FINISHED",
-            None,
-            headers,
+
+# Leagues to collect, with the moment after which their matches were played without
+# fans. Dates manually looked up on worldfootball.net
+FAN_EXCLUSIONS_PATH = "data/fan_exclusions.csv"
+
+SEASONS = [2018, 2019, 2020]
+
+# Days before the last stored match that are fetched again, to pick up corrected results
+LOOKBACK_DAYS = 7
+
+
+def read_fan_exclusions(path=FAN_EXCLUSIONS_PATH):
+    return pd.read_csv(path, index_col="league", parse_dates=["fans_excluded_after"])
+
+
+def parse_matches(response, comp, season):
+    if not response["matches"]:
+        return pd.DataFrame()
+
+    # Flattened into scalar columns in one step, see schema.API_FIELDS
+    matches = schema.normalize_matches(response["matches"])
+    # Partition keys as columns
+    matches["league"] = comp
+    matches["year"] = season
+    return matches
+
+
+def incremental_filters(comp, season):
+    # Date window that can still hold new or changed matches, None if the season is over
+    df = store.read_partition(comp, season, columns=["utcDate", "seasonEndDate"])
+    today = pd.Timestamp.utcnow().tz_convert(None).normalize()
+    lookback = pd.Timedelta(days=LOOKBACK_DAYS)
+    if df["seasonEndDate"].max() < today - lookback:
+        return None
+
+    date_from = df["utcDate"].max().normalize() - lookback
+    return {
+        "dateFrom": date_from.strftime("%Y-%m-%d"),
+        "dateTo": today.strftime("%Y-%m-%d"),
+    }
+
+
+def upsert(comp, season, matches):
+    # Stored matches are replaced by the fetched ones by id, when the API has a newer version
+    if matches.empty:
+        return None
+
+    df = store.read_partition(comp, season)
+    stored_updated = df["lastUpdated"].reindex(matches.index)
+    matches = matches[stored_updated.isna() | (matches["lastUpdated"] > stored_updated)]
+    if matches.empty:
+        return None
+
+    df = pd.concat([df.drop(index=matches.index, errors="ignore"), matches])
+    return df.sort_values(by="utcDate", kind="mergesort")
+
+
+def label_corona(matches, fans_excluded_after):
+    matches["corona"] = np.where(
+        matches["utcDate"] <= fans_excluded_after, "pre", "post"
+    )
+    return matches
+
+
+def process(comp, season, response, fan_exclusions, stored):
+    # parse -> upsert into the stored partition -> corona labels -> types -> write,
+    # all in memory
+    matches = parse_matches(response, comp, season)
+    if not matches.empty:
+        # Never stored (see schema.apply_schema), so never new or changed either
+        matches = matches.dropna(subset=["matchday"])
+    if (comp, season) in stored:
+        matches = upsert(comp, season, matches)
+        if matches is None:
+            return None
+    elif matches.empty:
+        return None
+
+    matches = label_corona(matches, fan_exclusions.loc[comp, "fans_excluded_after"])
+    matches = schema.apply_schema(matches)
+    store.write_partition(matches, comp, season)
+    return matches
+
+
+def main(incremental=False):
+    client = api.Client(API_SOCCER)
+    fan_exclusions = read_fan_exclusions()
+    keys = [(comp, season) for comp in fan_exclusions.index for season in SEASONS]
+
+    # Incremental runs only fetch the date window that can still change per partition
+    stored = store.list_partitions() if incremental else []
+    key_filters = {key: incremental_filters(*key) for key in keys if key in stored}
+    keys = [key for key in keys if key_filters.get(key, {}) is not None]
+
+    # Seasons are processed as they arrive, while the other requests are still running
+    frames = {}
+    for (comp, season), response in client.iter_matches(
+        keys, key_filters=key_filters, status="FINISHED"
+    ):
+        matches = process(comp, season, response, fan_exclusions, stored)
+        if matches is not None:
+            frames[(comp, season)] = matches[store.COLUMNS]
+
+    if frames:
+        # Aggregate cube for the dashboard callbacks, unchanged partitions come from disk
+        final_df = schema.concat(
+            [
+                (
+                    frames[key]
+                    if key in frames
+                    else store.read_partition(*key, columns=["id"] + store.COLUMNS)
+                )
+                for key in store.list_partitions()
+            ]
         )
-        response = json.loads(connection.getresponse().read().decode())
-
-        # Creating the empty DataFrame
-        matches = pd.DataFrame()
-
-        # Appending every match the the newly created DataFrame
-        for match in response["matches"]:
-            matches = matches.append(match, ignore_index=True)
-
-        # Preprocessing
-        # Correct type for ID and setting as index
-        matches["id"] = matches["id"].astype("int32")
-        matches = matches.set_index("id")
-        # Remove odds
-        matches = matches.drop(columns=["odds"])
-        # Include winner as separate column
-        matches["winner"] = [d.get("winner") for d in matches.score]
-        # Include home team and away team as separate column
-        matches["homeTeamName"] = [d.get("name") for d in matches.homeTeam]
-        matches["awayTeamName"] = [d.get("name") for d in matches.awayTeam]
-
-        ## Saving the data
-        matches.to_csv(f"data/{comp}_{season}.csv")
-        matches.to_pickle(f"data/{comp}_{season}.pickle")
-
-        # Sleep 10 seconds, because we only have 10 calls per minute
-        time.sleep(10)
-
-# Preprocessing 2018
-# Eredivisie, Premier League, Bundesliga, Ligue 1, Serie A, Primera Divison
-competitions = ["DED", "PL", "BL1", "FL1", "SA", "PD"]
-seasons = [2018]
-
-for comp in competitions:
-    for season in seasons:
-        df = pd.read_pickle(f"data/{comp}_{season}.pickle")
-        df["corona"] = "pre"
-        df.to_pickle(f"data/{comp}_{season}.pickle")
-
-# Preprocessing 2019
-# Eredivisie, Premier League, Bundesliga, Ligue 1, Serie A, Primera Divison
-competitions = ["DED", "PL", "BL1", "FL1", "SA", "PD"]
-seasons = [2019]
-
-# Dates manually looked up on worldfootball.net
-
-for comp in competitions:
-    for season in seasons:
-        df = pd.read_pickle(f"data/{comp}_{season}.pickle")
-        df["utcDate"] = pd.to_datetime(df["utcDate"]).dt.tz_localize(None)
-        if comp == "DED":
-            df["corona"] = "pre"
-            df.to_pickle(f"data/{comp}_{season}.pickle")
-        elif comp == "PL":
-            # 1st of March, last game with fans
-            df["corona"] = np.where(
-                df["utcDate"] <= pd.Timestamp("2020-03-01").floor("D"), "pre", "post"
-            )
-            df.to_pickle(f"data/{comp}_{season}.pickle")
-        elif comp == "BL1":
-            # 8th of March, last game with fans
-            df["corona"] = np.where(
-                df["utcDate"] <= pd.Timestamp("2020-03-08").floor("D"), "pre", "post"
-            )
-            df.to_pickle(f"data/{comp}_{season}.pickle")
-        elif comp == "FL1":
-            df["corona"] = "pre"
-            df.to_pickle(f"data/{comp}_{season}.pickle")
-        elif comp == "SA":
-            # 1st of March, last game with fans
-            df["corona"] = np.where(
-                df["utcDate"] <= pd.Timestamp("2020-03-01").floor("D"), "pre", "post"
-            )
-            df.to_pickle(f"data/{comp}_{season}.pickle")
-        elif comp == "PD":
-            # 8th of March, last game with fans
-            df["corona"] = np.where(
-                df["utcDate"] <= pd.Timestamp("2020-03-08").floor("D"), "pre", "post"
-            )
-            df.to_pickle(f"data/{comp}_{season}.pickle")
-
-# Preprocessing 2020
-# Eredivisie, Premier League, Bundesliga, Ligue 1, Serie A, Primera Divison
-competitions = ["DED", "PL", "BL1", "FL1", "SA", "PD"]
-seasons = [2020]
-
-for comp in competitions:
-    for season in seasons:
-        df = pd.read_pickle(f"data/{comp}_{season}.pickle")
-        df["corona"] = "post"
-        df.to_pickle(f"data/{comp}_{season}.pickle")
-
-# Combining all datasets
-# Eredivisie, Premier League, Bundesliga, Ligue 1, Serie A, Primera Divison
-competitions = ["DED", "PL", "BL1", "FL1", "SA", "PD"]
-seasons = [2018, 2019, 2020]
-
-final_df = pd.DataFrame()
-
-for comp in competitions:
-    for season in seasons:
-        df = pd.read_pickle(f"data/{comp}_{season}.pickle")
-        df["utcDate"] = pd.to_datetime(df["utcDate"]).dt.tz_localize(None)
-        df["league"] = comp
-        df["year"] = season
-        final_df = final_df.append(df)
-
-final_df.to_pickle("data/all_data.pickle")
-final_df.to_csv("data/all_data.csv")
+        cube_df = cube.build_cube(final_df)
+        cube.write_cube(cube_df)
+        # Significance of the pre/post differences, one process per league
+        stats.write_stats(stats.compute(cube_df))
+        # Team ratings continue from the stored state when only new matches came in
+        if incremental:
+            elo.update(final_df)
+        else:
+            elo.write(*elo.replay(final_df))
+        # Every dashboard view of one league rendered ahead, see snapshot.py
+        snapshot.build()
+
+    return list(frames)
+
+
+if __name__ == "__main__":
+    # Only fetch and rewrite new or changed matches: python data.py --incremental
+    main(incremental="--incremental" in sys.argv)
@@ -0,0 +1,249 @@
+import json
+import os
+import threading
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import pyarrow.feather as feather
+
+import store
+
+RATINGS_PATH = "data/elo.feather"
+STATE_PATH = "data/elo_state.json"
+
+INITIAL_RATING = 1500.0
+# Rating points moved per unit of surprise
+K = 20.0
+# Step of the running home advantage per unit of surprise, per league
+K_HOME = 2.0
+INITIAL_HOME_ADVANTAGE = 60.0
+# Share of a team's distance to the initial rating given up between seasons
+SEASON_REGRESSION = 1 / 3
+
+SCORES = {"HOME_TEAM": 1.0, "DRAW": 0.5, "AWAY_TEAM": 0.0}
+
+_lock = threading.Lock()
+_ratings = None
+
+
+def expected_score(difference):
+    # Expected home score for a rating difference, home advantage included
+    return 1 / (1 + 10 ** (-difference / 400))
+
+
+def initial_state():
+    return {"teams": [], "ratings": [], "lastYear": [], "homeAdvantage": {}}
+
+
+def replay(matches, state=None):
+    # Pre-game ratings of every match, processed in utcDate order, and the state to
+    # continue from with later matches
+    state = state or initial_state()
+    matches = matches.sort_values(by="utcDate", kind="mergesort")
+
+    teams = list(state["teams"])
+    known = set(teams)
+    for team in pd.unique(
+        matches[["homeTeamName", "awayTeamName"]].to_numpy().ravel("F")
+    ):
+        if team not in known:
+            teams.append(team)
+            known.add(team)
+    n_new = len(teams) - len(state["teams"])
+    ratings = state["ratings"] + [INITIAL_RATING] * n_new
+    last_year = state["lastYear"] + [-1] * n_new
+
+    home_advantage = dict(state["homeAdvantage"])
+    leagues = sorted(set(home_advantage) | set(matches["league"].unique()))
+    advantage = [
+        home_advantage.get(league, INITIAL_HOME_ADVANTAGE) for league in leagues
+    ]
+
+    # Plain lists, numpy scalar indexing is slower per match
+    home = pd.Categorical(matches["homeTeamName"], categories=teams).codes.tolist()
+    away = pd.Categorical(matches["awayTeamName"], categories=teams).codes.tolist()
+    league = pd.Categorical(matches["league"], categories=leagues).codes.tolist()
+    year = matches["year"].to_numpy().astype(int).tolist()
+    score = matches["winner"].map(SCORES).to_numpy(dtype=float)
+
+    n = len(matches)
+    # One match at a time: the home advantage of a league moves with every match, so
+    # later matches always see the same history, replayed in full or continued from
+    # the state
+    home_rating, away_rating = [0.0] * n, [0.0] * n
+    match_advantage, expected = [0.0] * n, [0.0] * n
+    for i, (h, a, l, y, s) in enumerate(zip(home, away, league, year, score.tolist())):
+        # First match of a new season: part of the way back to the initial rating
+        for team in (h, a):
+            if last_year[team] != y:
+                if last_year[team] >= 0:
+                    ratings[team] += SEASON_REGRESSION * (
+                        INITIAL_RATING - ratings[team]
+                    )
+                last_year[team] = y
+
+        home_rating[i], away_rating[i] = ratings[h], ratings[a]
+        match_advantage[i] = advantage[l]
+        expected[i] = expected_score(ratings[h] + advantage[l] - ratings[a])
+        surprise = s - expected[i]
+        ratings[h] += K * surprise
+        ratings[a] -= K * surprise
+        advantage[l] += K_HOME * surprise
+
+    rows = pd.DataFrame(
+        {
+            "league": matches["league"].to_numpy(),
+            "year": matches["year"].to_numpy(),
+            "corona": matches["corona"].to_numpy(),
+            "utcDate": matches["utcDate"].to_numpy(),
+            "homeTeamName": matches["homeTeamName"].to_numpy(),
+            "awayTeamName": matches["awayTeamName"].to_numpy(),
+            "homeRating": home_rating,
+            "awayRating": away_rating,
+            "homeAdvantage": match_advantage,
+            "expectedHome": expected,
+            "homeScore": score,
+        },
+        index=matches.index,
+    )
+    state = {
+        "teams": teams,
+        "ratings": ratings,
+        "lastYear": last_year,
+        "homeAdvantage": dict(zip(leagues, advantage)),
+        "lastDate": str(matches["utcDate"].max()) if n else state.get("lastDate"),
+    }
+    return rows, state
+
+
+def fit_home_advantage(rows, by=("league", "corona"), iterations=20):
+    # Home advantage in rating points that makes the expected home score of every
+    # group equal to its actual home score, given the pre-game ratings. This is the
+    # maximum likelihood intercept, solved with Newton steps for all groups at once
+    groups = rows.groupby(list(by), observed=True).ngroup().to_numpy()
+    difference = (rows["homeRating"] - rows["awayRating"]).to_numpy()
+    score = rows["homeScore"].to_numpy()
+    fitted = np.full(groups.max() + 1, INITIAL_HOME_ADVANTAGE)
+    for _ in range(iterations):
+        expected = expected_score(difference + fitted[groups])
+        gradient = np.bincount(groups, score - expected)
+        slope = np.bincount(groups, expected * (1 - expected)) * np.log(10) / 400
+        fitted += gradient / slope
+
+    keys = rows.groupby(list(by), observed=True).size()
+    return pd.DataFrame(
+        {
+            "matches": keys.to_numpy(),
+            "homeAdvantage": fitted,
+            # Expected home score of two equally rated teams
+            "expectedHome": expected_score(fitted),
+        },
+        index=keys.index,
+    )
+
+
+def write(rows, state, ratings_path=RATINGS_PATH, state_path=STATE_PATH):
+    store.write_feather(rows.reset_index(), ratings_path)
+    with open(state_path + ".tmp", "w") as f:
+        json.dump(state, f)
+    os.replace(state_path + ".tmp", state_path)
+
+
+def read_state(root=None):
+    state_path = store.data_path(STATE_PATH, root)
+    if not os.path.exists(state_path):
+        return None
+    with open(state_path) as f:
+        return json.load(f)
+
+
+def read_ratings(root=None):
+    ratings_path = store.data_path(RATINGS_PATH, root)
+    if not os.path.exists(ratings_path):
+        # No ratings from data.py yet, replay the stored matches
+        data_dir = store.data_path(store.DATA_DIR, root)
+        matches = pd.concat(
+            [
+                store.read_partition(
+                    league, year, columns=["id"] + store.COLUMNS, data_dir=data_dir
+                )
+                for league, year in store.list_partitions(data_dir)
+            ]
+        )
+        return replay(matches)[0]
+    return feather.read_table(ratings_path, memory_map=True).to_pandas().set_index("id")
+
+
+def update(matches):
+    # Matches played after the last processed one continue from the stored state.
+    # Corrected or late results change the history, then everything is replayed
+    state = read_state()
+    if state is None or not os.path.exists(store.data_path(RATINGS_PATH)):
+        return write(*replay(matches))
+
+    rows = read_ratings()
+    new = matches[~matches.index.isin(rows.index)]
+    stored = matches[matches.index.isin(rows.index)]
+    changed = (
+        stored["winner"].map(SCORES).to_numpy()
+        != rows.loc[stored.index, "homeScore"].to_numpy()
+    )
+    if changed.any() or (new["utcDate"] <= pd.Timestamp(state["lastDate"])).any():
+        return write(*replay(matches))
+    if not new.empty:
+        new_rows, state = replay(new, state)
+        write(pd.concat([rows, new_rows]), state)
+
+
+def get_ratings():
+    global _ratings
+    if _ratings is None:
+        with _lock:
+            if _ratings is None:
+                _ratings = read_ratings()
+    return _ratings
+
+
+@store.on_reload
+def clear_ratings():
+    global _ratings
+    with _lock:
+        _ratings = None
+    selection_home_advantage.cache_clear()
+
+
+@store.on_load
+def load_ratings(root):
+    ratings = read_ratings(root)
+
+    def install():
+        global _ratings
+        with _lock:
+            _ratings = ratings
+
+    return install
+
+
+@lru_cache(maxsize=64)
+def selection_home_advantage(leagues):
+    # Fitted per corona period over the matches of the selected leagues
+    rows = get_ratings()
+    rows = rows[rows["league"].isin(leagues)]
+    if rows.empty:
+        return None
+    return fit_home_advantage(rows, by=["corona"])
+
+
+def summary_text(leagues):
+    fitted = selection_home_advantage(leagues)
+    if fitted is None or not {"pre", "post"} <= set(fitted.index):
+        return ""
+    pre, post = fitted.loc["pre"], fitted.loc["post"]
+    return (
+        f"Corrected for team strength with Elo ratings, the home advantage is worth "
+        f"{pre['homeAdvantage']:.0f} rating points before corona and "
+        f"{post['homeAdvantage']:.0f} after: an expected home score of "
+        f"{pre['expectedHome']:.1%} and {post['expectedHome']:.1%} between equally "
+        f"rated teams."
+    )
@@ -0,0 +1,74 @@
+import json
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+import plotly.utils
+
+import store
+
+# Byte budget for the serialized outputs of all cached callbacks together
+MAX_BYTES = 16 * 1024 * 1024
+
+_lock = threading.Lock()
+_entries = OrderedDict()
+_size = 0
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def cache_key(func, args):
+    # Multi-value inputs arrive as lists, which are not hashable
+    return (func.__name__,) + tuple(
+        tuple(arg) if isinstance(arg, list) else arg for arg in args
+    )
+
+
+def cached(func):
+    # Callback outputs are pure functions of the sidebar state, store them as JSON
+    @wraps(func)
+    def wrapper(*args):
+        key = cache_key(func, args)
+        with _lock:
+            entry = _entries.get(key)
+            if entry is not None:
+                _entries.move_to_end(key)
+                _stats["hits"] += 1
+            else:
+                _stats["misses"] += 1
+        if entry is not None:
+            return json.loads(entry)
+
+        # PreventUpdate and other exceptions propagate and are never cached
+        output = func(*args)
+        put(key, json.dumps(output, cls=plotly.utils.PlotlyJSONEncoder))
+        return output
+
+    return wrapper
+
+
+def put(key, entry):
+    global _size
+    if len(entry) > MAX_BYTES:
+        return
+    with _lock:
+        if key in _entries:
+            _size -= len(_entries.pop(key))
+        _entries[key] = entry
+        _size += len(entry)
+        while _size > MAX_BYTES:
+            _, evicted = _entries.popitem(last=False)
+            _size -= len(evicted)
+            _stats["evictions"] += 1
+
+
+def cache_info():
+    with _lock:
+        return dict(_stats, entries=len(_entries), bytes=_size, max_bytes=MAX_BYTES)
+
+
+@store.on_reload
+def clear():
+    global _size
+    with _lock:
+        _entries.clear()
+        _size = 0
@@ -1,52 +1,144 @@
+from functools import lru_cache
+
+import numpy as np
 import pandas as pd
-import plotly.graph_objects as go
 
+import cube
+import instrument
+import store
 
-def fill_df_teams(df, df_teams):
-    for index, row in df.iterrows():
-        if row[0] == "HOME_TEAM":
-            df_teams[row[1]]["HOME_TEAM"] += 1
-        elif row[0] == "AWAY_TEAM":
-            df_teams[row[2]]["AWAY_TEAM"] += 1
-        elif row[0] == "DRAW":
-            df_teams[row[1]]["DRAW"] += 1
-            df_teams[row[2]]["DRAW"] += 1
+# Number of distinct (mode, league, year) queries kept in memory
+QUERY_CACHE_SIZE = 64
 
-    return df_teams
 
+def query_key(prepost_or_year, league, year):
+    # The year selector is hidden in prepost mode, so it is not part of the key there
+    if prepost_or_year == "prepost":
+        return prepost_or_year, league, None
+    return prepost_or_year, league, int(year)
 
-def read_data(prepost_or_year, league, year):
-    df = pd.read_pickle("data/all_data.pickle").dropna(subset=["matchday"])
 
-    if prepost_or_year == "prepost":
-        df_pre = df[(df["corona"] == "pre") & (df["league"] == league)]
-        df_post = df[(df["corona"] == "post") & (df["league"] == league)]
-        return df_pre, df_post
-    elif prepost_or_year == "year":
-        df = df[(df["year"] == int(year)) & (df["league"] == league)]
-        return df
+@instrument.timed
+def team_names(prepost_or_year, leagues, years):
+    # Union of the teams of every selected league and season
+    names = set()
+    for league in leagues:
+        if prepost_or_year == "prepost":
+            names.update(cached_team_names(*query_key(prepost_or_year, league, None)))
+        else:
+            for year in years:
+                names.update(
+                    cached_team_names(*query_key(prepost_or_year, league, year))
+                )
+    return tuple(sorted(names))
+
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+@instrument.timed
+def cached_team_names(prepost_or_year, league, year):
+    # Every team with a match in the rollups of the league (and season)
+    years = None if prepost_or_year == "prepost" else [year]
+    frames = [rollups["teams"] for rollups in cube.select([league], years)]
+    instrument.scanned(sum(frame.shape[1] for frame in frames))
+    names = set()
+    for frame in frames:
+        names.update(frame.columns)
+    return tuple(sorted(names))
+
+
+@instrument.timed
+def team_lists():
+    lists = {}
+    for league, year in store.partition_keys():
+        lists.setdefault(
+            league, {"prepost": list(cached_team_names("prepost", league, None))}
+        )
+        lists[league][str(year)] = list(cached_team_names("year", league, year))
+    return lists
+
+
+@store.on_reload
+def clear_query_cache():
+    cached_team_names.cache_clear()
+    cached_points_series.cache_clear()
 
 
-def update_axes(graph):
-    graph.update_xaxes(title="Home/away win or draw")
-    graph.update_yaxes(title=f"Amount")
+# Decimals of the floats in figure payloads, more than a chart can show
+FIGURE_DECIMALS = 4
 
+# The settings of plotly's default template the charts rely on. go.Figure ships the
+# full template, about 7 kB of JSON, with every figure
+AXIS_STYLE = {
+    "gridcolor": "white",
+    "linecolor": "white",
+    "zerolinecolor": "white",
+    "zerolinewidth": 2,
+    "automargin": True,
+}
+FIGURE_TEMPLATE = {
+    "layout": {
+        "colorway": ["#636efa", "#EF553B", "#00cc96", "#ab63fa"],
+        "plot_bgcolor": "#E5ECF6",
+        "font": {"color": "#2a3f5f"},
+        "hovermode": "closest",
+        "xaxis": AXIS_STYLE,
+        "yaxis": AXIS_STYLE,
+    }
+}
 
-def preprocess_avg_points(df):
-    df = df.sort_values(by="utcDate")
-    df["matchday"] = df["matchday"].astype(int)
-    df["yearMatchday"] = df["year"].astype(str) + "_" + df["matchday"].astype(str)
-    dff = df[["yearMatchday", "winner"]]
-    return dff
 
+def compact(values):
+    # Plain lists for the JSON encoder, floats rounded and NaN as null
+    values = np.asarray(values)
+    if values.dtype.kind == "f":
+        return [
+            None if np.isnan(value) else value
+            for value in np.round(values, FIGURE_DECIMALS).tolist()
+        ]
+    return values.tolist()
+
+
+def bar_trace(x, y, **trace):
+    return {"type": "bar", "x": compact(x), "y": compact(y), **trace}
+
+
+def line_trace(x, y, **trace):
+    return {
+        "type": "scatter",
+        "mode": "lines",
+        "x": compact(x),
+        "y": compact(y),
+        **trace,
+    }
+
+
+def figure(traces, xaxis_title, yaxis_title, **layout):
+    # Dict figures, plotly.js applies its defaults for everything left out
+    return {
+        "data": traces,
+        "layout": {
+            "template": FIGURE_TEMPLATE,
+            "xaxis": {"title": {"text": xaxis_title}},
+            "yaxis": {"title": {"text": yaxis_title}},
+            **layout,
+        },
+    }
+
+
+def outcome_figure(counts, colors):
+    # Home wins, away wins and draws, counts indexed by outcome
+    return figure(
+        [bar_trace(counts.index, counts, marker={"color": colors})],
+        "Home/away win or draw",
+        "Amount",
+    )
 
-def fill_points_df(df, points_df):
-    for index, row in df.iterrows():
-        points_df["numberOfMatches"][row[0]] += 1
-        if row[1] == "HOME_TEAM":
-            points_df["homeTeamPoints"][row[0]] += 3
-        elif row[1] == "AWAY_TEAM":
-            points_df["awayTeamPoints"][row[0]] += 3
+
+@instrument.timed
+def fill_points_df(points_df):
+    instrument.scanned(len(points_df))
+    points_df = points_df.copy()
+    points_df.index = [f"{year}_{matchday}" for year, matchday in points_df.index]
 
     points_df["homeAvgPoints"] = (
         points_df["homeTeamPoints"] / points_df["numberOfMatches"]
@@ -55,7 +147,107 @@ def fill_points_df(df, points_df):
         points_df["awayTeamPoints"] / points_df["numberOfMatches"]
     )
 
-    points_df["maHomePoints"] = points_df.iloc[:, 3].rolling(window=3).mean()
-    points_df["maAwayPoints"] = points_df.iloc[:, 4].rolling(window=3).mean()
+    # Running totals of the averages, a simple window is the difference of two of them
+    points_df["homeCumPoints"] = points_df["homeAvgPoints"].cumsum()
+    points_df["awayCumPoints"] = points_df["awayAvgPoints"].cumsum()
 
     return points_df
+
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+@instrument.timed
+def cached_points_series(leagues):
+    # Average points per matchday before and after corona with their running totals,
+    # computed once per league selection and shared by every window
+    points_df_pre = cube.matchday_points(leagues, corona="pre")
+    # Fix for weird cases where matches from earlier match days were played in post corona time
+    points_df_post = cube.matchday_points(leagues, corona="post", new_only=True)
+
+    return fill_points_df(points_df_pre), fill_points_df(points_df_post)
+
+
+@instrument.timed
+def points_series(leagues):
+    # The returned frames are shared by every callback, do not modify them
+    return cached_points_series(tuple(sorted(leagues)))
+
+
+@instrument.timed
+def rolling_points(points_df, venue, window, window_type):
+    # Rolling average of the home or away average points over window matchdays,
+    # NaN until the first window is full like pandas rolling
+    instrument.scanned(len(points_df))
+    averages = points_df[f"{venue}AvgPoints"]
+    if window <= 1:
+        return averages.to_numpy()
+    if window_type == "exponential":
+        # Recursive, one pass over the stored averages
+        return averages.ewm(span=window, min_periods=window).mean().to_numpy()
+    cumulative = np.concatenate([[0], points_df[f"{venue}CumPoints"].to_numpy()])
+    rolled = (cumulative[window:] - cumulative[:-window]) / window
+    return np.concatenate([np.full(len(averages) - len(rolled), np.nan), rolled])
+
+
+# Goals per team per match up to which the Poisson probabilities are summed
+MAX_GOALS = 15
+
+GOAL_METRICS = {
+    "homeGoals": ("Home goals per match", "{:.2f}"),
+    "awayGoals": ("Away goals per match", "{:.2f}"),
+    "goalDifference": ("Goal difference per match", "{:+.2f}"),
+    "homeGoalShare": ("Home share of the goals", "{:.1%}"),
+    "expectedHomePoints": ("Expected home points per game", "{:.2f}"),
+}
+
+
+@instrument.timed
+def expected_home_points(home_rate, away_rate):
+    # Home points per game if home and away goals were independent Poisson counts
+    goals = np.arange(MAX_GOALS + 1)
+    factorial = np.cumprod(np.maximum(goals, 1))
+    home = np.exp(-home_rate)[:, None] * home_rate[:, None] ** goals / factorial
+    away = np.exp(-away_rate)[:, None] * away_rate[:, None] ** goals / factorial
+    # joint[:, i, j]: probability of i home goals and j away goals
+    joint = home[:, :, None] * away[:, None, :]
+    win = (joint * np.tri(len(goals), k=-1)).sum(axis=(1, 2))
+    draw = np.trace(joint, axis1=1, axis2=2)
+    return 3 * win + draw
+
+
+@instrument.timed
+def goal_metrics(totals):
+    # Per match goal metrics for every row of summed goals, at half-time and full-time
+    metrics = {}
+    for suffix, time in [("HT", "Half-time"), ("", "Full-time")]:
+        home = totals[f"homeGoals{suffix}"] / totals["matches"]
+        away = totals[f"awayGoals{suffix}"] / totals["matches"]
+        metrics[time] = pd.DataFrame(
+            {
+                "homeGoals": home,
+                "awayGoals": away,
+                "goalDifference": home - away,
+                "homeGoalShare": home / (home + away),
+                "expectedHomePoints": expected_home_points(
+                    home.to_numpy(), away.to_numpy()
+                ),
+            }
+        )
+    return pd.concat(metrics, names=["time"])
+
+
+@instrument.timed
+def goals_table(metrics, home_points):
+    # Markdown table, one column per half-time/full-time and period
+    columns = list(metrics.index)
+    header = [f"{time}, {period}" if period else time for time, period in columns]
+    lines = ["| | " + " | ".join(header) + " |", "|---" * (len(columns) + 1) + "|"]
+    for metric, (label, fmt) in GOAL_METRICS.items():
+        cells = [fmt.format(value) for value in metrics[metric]]
+        lines.append(f"| {label} | " + " | ".join(cells) + " |")
+    # Points are only known for the final score
+    cells = [
+        f"{home_points[period]:.2f}" if time == "Full-time" else ""
+        for time, period in columns
+    ]
+    lines.append("| Actual home points per game | " + " | ".join(cells) + " |")
+    return "\n".join(lines)
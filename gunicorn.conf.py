@@ -0,0 +1,65 @@
+import gc
+import os
+
+# Import app.py once in the master, the workers are forked with the matches, the
+# cube rollups and the query caches already in memory and share those pages
+# copy-on-write. PRELOAD_APP=0 loads a private copy in every worker instead
+preload_app = os.environ.get("PRELOAD_APP", "1") != "0"
+
+# REPORT_MEMORY=1 logs the memory of the master and of every worker at startup
+REPORT_MEMORY = os.environ.get("REPORT_MEMORY", "0") != "0"
+
+
+def memory_usage(pid="self"):
+    # Rss counts shared pages in full for every process, Pss divides them among the
+    # processes sharing them, so the sum of Pss is the real total
+    usage = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if value.strip().endswith("kB"):
+                    usage[key] = int(value.split()[0])
+    except OSError:
+        return None
+    return {
+        "rss": usage["Rss"],
+        "pss": usage["Pss"],
+        "shared": usage["Shared_Clean"] + usage["Shared_Dirty"],
+        "private": usage["Private_Clean"] + usage["Private_Dirty"],
+    }
+
+
+def log_memory(log, name, pid="self"):
+    usage = memory_usage(pid)
+    if usage is None:
+        log.info("%s: memory usage needs /proc/<pid>/smaps_rollup (Linux)", name)
+        return
+    log.info(
+        "%s: rss %.1f MB, pss %.1f MB, shared %.1f MB, private %.1f MB",
+        name,
+        *(usage[key] / 1024 for key in ["rss", "pss", "shared", "private"]),
+    )
+
+
+def when_ready(server):
+    if preload_app:
+        # Objects created while loading the app are left alone by the garbage
+        # collector, otherwise its bookkeeping writes to (and copies) shared pages
+        gc.collect()
+        gc.freeze()
+    if REPORT_MEMORY:
+        log_memory(server.log, "master")
+
+
+def post_worker_init(worker):
+    if REPORT_MEMORY:
+        log_memory(worker.log, f"worker {worker.pid}")
+
+
+def child_exit(server, worker):
+    # Per worker metric files of prometheus-client's multiprocess mode, see instrument.py
+    if "prometheus_multiproc_dir" in os.environ:
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
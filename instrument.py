@@ -0,0 +1,146 @@
+import os
+import threading
+import time
+from functools import wraps
+
+import flask
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# INSTRUMENT=0 leaves every function unwrapped and registers no request hooks
+ENABLED = os.environ.get("INSTRUMENT", "1") != "0"
+
+FUNCTION_SECONDS = Histogram(
+    "dash_function_seconds",
+    "Wall time of instrumented functions and callbacks",
+    ["function"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+ROWS_SCANNED = Histogram(
+    "dash_function_rows_scanned",
+    "Rows of the data frames an instrumented function goes through",
+    ["function"],
+    buckets=(10, 100, 1000, 10000, 100000, 1000000, 10000000),
+)
+REQUEST_SECONDS = Histogram(
+    "dash_callback_request_seconds",
+    "Wall time of /_dash-update-component requests per callback output",
+    ["output"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+PAYLOAD_BYTES = Histogram(
+    "dash_callback_payload_bytes",
+    "Uncompressed response size of /_dash-update-component per callback output",
+    ["output"],
+    buckets=(1000, 10000, 50000, 100000, 250000, 500000, 1000000, 5000000),
+)
+
+_local = threading.local()
+
+
+def scanned(n_rows):
+    # Reported by the functions reading data, with the rows they actually go through.
+    # Added up per instrumented call and per request, cached results report nothing
+    if getattr(_local, "rows", None) is not None:
+        _local.rows += n_rows
+
+
+def timed(func):
+    if not ENABLED:
+        return func
+
+    name = func.__name__
+    seconds = FUNCTION_SECONDS.labels(name)
+    rows = ROWS_SCANNED.labels(name)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        # Rows reported during the call, nested instrumented calls included
+        outer = getattr(_local, "rows", None)
+        _local.rows = 0
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            n_rows = _local.rows
+            _local.rows = outer
+
+        if outer is not None:
+            _local.rows = outer + n_rows
+        seconds.observe(elapsed)
+        rows.observe(n_rows)
+        timings = getattr(_local, "timings", None)
+        if timings is not None:
+            timings.append((name, elapsed))
+        return result
+
+    return wrapper
+
+
+def server_timing(timings, total, n_rows, payload):
+    # Calls of the same function are summed, in order of their first call
+    durations = {}
+    for name, elapsed in timings:
+        durations[name] = durations.get(name, 0) + elapsed
+    metrics = [
+        f"{name};dur={elapsed * 1000:.2f}" for name, elapsed in durations.items()
+    ]
+    metrics.append(f"total;dur={total * 1000:.2f}")
+    metrics.append(f'rows;desc="{n_rows}"')
+    metrics.append(f'payload;desc="{payload}"')
+    return ", ".join(metrics)
+
+
+def callback_output(request):
+    # First output id, e.g. ..double_winner_graph_pre.figure...text.children..
+    output = (request.get_json(silent=True) or {}).get("output", "")
+    return output.strip(".").split(".")[0]
+
+
+def before_request():
+    _local.timings = []
+    _local.rows = 0
+    _local.start = time.perf_counter()
+
+
+def after_request(response):
+    timings = getattr(_local, "timings", None)
+    if timings is None:
+        return response
+    total = time.perf_counter() - _local.start
+    n_rows = _local.rows
+    _local.timings = _local.rows = None
+
+    payload = 0 if response.direct_passthrough else len(response.get_data())
+    if flask.request.path.endswith("/_dash-update-component"):
+        output = callback_output(flask.request)
+        REQUEST_SECONDS.labels(output).observe(total)
+        PAYLOAD_BYTES.labels(output).observe(payload)
+    response.headers["Server-Timing"] = server_timing(timings, total, n_rows, payload)
+    return response
+
+
+def metrics():
+    # Under gunicorn every worker writes its own files, see prometheus_multiproc_dir
+    if "prometheus_multiproc_dir" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return flask.Response(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
+
+
+def init_app(server):
+    if not ENABLED:
+        return
+    server.before_request(before_request)
+    # Registered after Flask-Compress, so it runs first and sees the uncompressed body
+    server.after_request(after_request)
+    server.add_url_rule("/metrics", "metrics", metrics)
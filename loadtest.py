@@ -0,0 +1,325 @@
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+import pandas as pd
+
+import synthetic
+from benchmark import callback_payload
+
+# Inputs a user can change, see app.layout
+SIDEBAR = [
+    "prepost_or_year",
+    "leagueselector",
+    "yearselector",
+    "teamselector",
+    "windowselector",
+    "windowtype",
+]
+
+# Initial values of the sidebar
+DEFAULTS = {
+    "prepost_or_year": "prepost",
+    "leagueselector": ["PL"],
+    "yearselector": ["2020"],
+    "teamselector": None,
+    "windowselector": 1,
+    "windowtype": "simple",
+}
+
+# Relative frequency of the actions of a simulated user
+ACTIONS = {"mode": 1, "league": 2, "year": 2, "team": 4, "window": 2}
+
+# Rolling windows a simulated user picks from, see app.MAX_WINDOW
+WINDOWS = range(1, 39)
+
+PERCENTILES = [50, 95, 99]
+
+
+class Session:
+    # One simulated user: a keep-alive connection and the state of the sidebar
+    def __init__(self, url, dependencies, team_lists, seed):
+        url = urlsplit(url)
+        self.connection = http.client.HTTPConnection(url.netloc, timeout=60)
+        self.dependencies = dependencies
+        self.team_lists = team_lists
+        self.random = random.Random(seed)
+        self.values = dict(DEFAULTS)
+        self.samples = []
+
+    def post(self, payload):
+        body = json.dumps(payload)
+        start = time.perf_counter()
+        try:
+            self.connection.request(
+                "POST",
+                "/_dash-update-component",
+                body,
+                {"Content-Type": "application/json"},
+            )
+            response = self.connection.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            status = 0
+        self.samples.append((payload["output"], status, time.perf_counter() - start))
+
+    def fire(self, changed):
+        # The renderer calls every server callback that has a changed input
+        for dependency in self.dependencies:
+            if any(spec["id"] in changed for spec in dependency["inputs"]):
+                self.post(
+                    callback_payload(
+                        dependency["output"], dependency["inputs"], self.values
+                    )
+                )
+
+    def teams(self):
+        keys = (
+            ["prepost"]
+            if self.values["prepost_or_year"] == "prepost"
+            else self.values["yearselector"]
+        )
+        return sorted(
+            {
+                team
+                for league in self.values["leagueselector"]
+                for key in keys
+                for team in self.team_lists.get(league, {}).get(key, [])
+            }
+        )
+
+    def toggle(self, selection, options):
+        # Add or remove one option of a multi-select, at least one stays selected
+        option = self.random.choice(options)
+        if option not in selection:
+            return selection + [option]
+        if len(selection) > 1:
+            return [value for value in selection if value != option]
+        return selection
+
+    def act(self):
+        action = self.random.choices(list(ACTIONS), weights=list(ACTIONS.values()))[0]
+        if action == "mode":
+            self.values["prepost_or_year"] = (
+                "year" if self.values["prepost_or_year"] == "prepost" else "prepost"
+            )
+            changed = ["prepost_or_year"]
+        elif action == "league":
+            self.values["leagueselector"] = self.toggle(
+                self.values["leagueselector"], list(self.team_lists)
+            )
+            changed = ["leagueselector"]
+        elif action == "year":
+            years = sorted(
+                {
+                    key
+                    for league in self.values["leagueselector"]
+                    for key in self.team_lists[league]
+                    if key != "prepost"
+                }
+            )
+            self.values["yearselector"] = self.toggle(
+                self.values["yearselector"], years
+            )
+            changed = ["yearselector"]
+        elif action == "window":
+            self.values["windowselector"] = self.random.choice(WINDOWS)
+            self.values["windowtype"] = self.random.choice(["simple", "exponential"])
+            changed = ["windowselector", "windowtype"]
+        else:
+            teams = self.teams()
+            self.values["teamselector"] = self.random.choice(teams) if teams else None
+            changed = ["teamselector"]
+        self.fire(changed)
+
+    def run(self, stop, think):
+        # Page load: every callback fires once with the default values
+        self.fire(SIDEBAR)
+        while not stop.is_set():
+            self.act()
+            if think:
+                time.sleep(self.random.expovariate(1 / think))
+        self.connection.close()
+
+
+def get_json(url, path):
+    url = urlsplit(url)
+    connection = http.client.HTTPConnection(url.netloc, timeout=60)
+    try:
+        connection.request("GET", path)
+        response = connection.getresponse()
+        return json.loads(response.read())
+    finally:
+        connection.close()
+
+
+def find_component(layout, component_id):
+    if isinstance(layout, dict):
+        if layout.get("props", {}).get("id") == component_id:
+            return layout
+        children = layout.get("props", {}).get("children")
+        return find_component(children, component_id)
+    if isinstance(layout, list):
+        for child in layout:
+            found = find_component(child, component_id)
+            if found is not None:
+                return found
+    return None
+
+
+def run(url, users, duration, think, seed):
+    # The traffic is built from what the app serves, like the renderer does
+    dependencies = [
+        dependency
+        for dependency in get_json(url, "/_dash-dependencies")
+        if not dependency.get("clientside_function")
+    ]
+    team_lists = find_component(get_json(url, "/_dash-layout"), "team_lists")
+    sessions = [
+        Session(url, dependencies, team_lists["props"]["data"], seed + i)
+        for i in range(users)
+    ]
+
+    stop = threading.Event()
+    threads = [
+        threading.Thread(target=session.run, args=(stop, think)) for session in sessions
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    samples = pd.DataFrame(
+        [sample for session in sessions for sample in session.samples],
+        columns=["output", "status", "latency"],
+    )
+    return report(samples, elapsed)
+
+
+def report(samples, elapsed):
+    samples["output"] = samples["output"].str.strip(".").str.split(".").str[0]
+    samples["error"] = ~samples["status"].isin([200, 204])
+    latency = samples.groupby("output")["latency"]
+    summary = pd.DataFrame(
+        {
+            "requests": latency.size(),
+            "errors": samples.groupby("output")["error"].sum(),
+            "rps": latency.size() / elapsed,
+            **{f"p{q}_ms": latency.quantile(q / 100) * 1000 for q in PERCENTILES},
+        }
+    )
+    overall = {
+        "requests": len(samples),
+        "errors": int(samples["error"].sum()),
+        "rps": len(samples) / elapsed,
+        **{
+            f"p{q}_ms": samples["latency"].quantile(q / 100) * 1000 for q in PERCENTILES
+        },
+    }
+    summary.loc["all"] = overall
+    return summary
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers, threads, directory):
+    # gunicorn like the Procfile, the relative data paths resolve in directory
+    port = free_port()
+    root = os.path.dirname(os.path.abspath(__file__))
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            "app:server",
+            "--config",
+            os.path.join(root, "gunicorn.conf.py"),
+            "--pythonpath",
+            root,
+            "--bind",
+            f"127.0.0.1:{port}",
+            "--workers",
+            str(workers),
+            "--threads",
+            str(threads),
+        ],
+        cwd=directory,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("gunicorn exited during startup")
+        try:
+            get_json(url, "/_dash-dependencies")
+            return server, url
+        except (OSError, ValueError):
+            time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError("gunicorn did not start in time")
+
+
+def main(args):
+    if args.url:
+        return run(args.url, args.users, args.duration, args.think, args.seed)
+
+    with tempfile.TemporaryDirectory() as directory:
+        if args.scale:
+            synthetic.generate(directory, args.scale, args.seed)
+        else:
+            directory = os.getcwd()
+        server, url = start_server(args.workers, args.threads, directory)
+        try:
+            return run(url, args.users, args.duration, args.think, args.seed)
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Replay concurrent Dash callback traffic against the app"
+    )
+    parser.add_argument(
+        "--url", help="running app to test, by default gunicorn is started locally"
+    )
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument(
+        "--scale",
+        type=int,
+        default=0,
+        help="serve synthetic data of this volume instead of data/",
+    )
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument(
+        "--think", type=float, default=0, help="mean seconds between user actions"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    summary = main(args)
+    print(summary.round(2).to_string())
+    if args.json:
+        summary.to_json(args.json, orient="index", indent=2)
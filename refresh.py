@@ -0,0 +1,256 @@
+import argparse
+import hashlib
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+import flask
+import numpy as np
+import pandas as pd
+
+import cube
+import elo
+import stats
+import store
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Published versions kept on disk, the older ones are removed
+KEEP_VERSIONS = 3
+
+# Build output of snapshot.py, rebuilt in every new version
+SNAPSHOT_FILES = ["snapshots", "snapshot.json", "*.tmp"]
+
+# Seconds between the checks of every worker for a newly published version
+POLL_SECONDS = float(os.environ.get("REFRESH_POLL", "30"))
+
+log = logging.getLogger(__name__)
+
+_cond = threading.Condition()
+_active = 0
+_pending = None
+# Version that failed to load or install, skipped until another one is published
+_failed = None
+_watcher_pid = None
+
+
+def files_digest(root):
+    # Contents of everything data.py writes, to tell whether a run changed anything
+    digest = hashlib.sha1()
+    data_dir = store.data_path("data", root)
+    for directory, subdirectories, files in os.walk(data_dir):
+        # Pruned in place, os.walk does not descend into the removed ones
+        subdirectories[:] = sorted(
+            name for name in subdirectories if name not in SNAPSHOT_FILES
+        )
+        for name in sorted(files):
+            if name in SNAPSHOT_FILES or name.endswith(".tmp"):
+                continue
+            path = os.path.join(directory, name)
+            with open(path, "rb") as f:
+                digest.update(os.path.relpath(path, data_dir).encode() + f.read())
+    return digest.hexdigest()
+
+
+def count_matches(root):
+    data_dir = store.data_path(store.DATA_DIR, root)
+    return {
+        key: len(store.read_partition(*key, columns=store.COLUMNS, data_dir=data_dir))
+        for key in store.list_partitions(data_dir)
+    }
+
+
+def validate(root, base_root):
+    # A new version has to be complete, consistent and at least as large as the one
+    # it replaces, otherwise it is never published
+    matches, base_matches = count_matches(root), count_matches(base_root)
+    missing = set(base_matches) - set(matches)
+    if missing:
+        raise ValueError(f"partitions missing from the new version: {sorted(missing)}")
+    if sum(matches.values()) < sum(base_matches.values()):
+        raise ValueError(
+            f"{sum(matches.values())} matches, {sum(base_matches.values())} before"
+        )
+
+    for path in [cube.CUBE_PATH, stats.STATS_PATH, elo.RATINGS_PATH]:
+        if not os.path.exists(store.data_path(path, root)):
+            raise ValueError(f"{path} missing from the new version")
+    cube_df = cube.read_cube(root)
+    cube_matches = cube_df.loc[cube_df["venue"] == "home", "matches"].sum()
+    if cube_matches != sum(matches.values()):
+        raise ValueError(f"cube has {cube_matches} matches, the partitions more")
+    leagues = {league for league, _ in matches}
+    if set(stats.read_stats(root)) != leagues:
+        raise ValueError("stats do not cover every league")
+    ratings = elo.read_ratings(root)
+    if len(ratings) != sum(matches.values()):
+        raise ValueError("ratings do not cover every match")
+    # Ratings continued from the stored state have to be those of a full replay
+    data_dir = store.data_path(store.DATA_DIR, root)
+    replayed = elo.replay(
+        pd.concat(
+            [
+                store.read_partition(
+                    *key, columns=["id"] + store.COLUMNS, data_dir=data_dir
+                )
+                for key in matches
+            ]
+        )
+    )[0]
+    columns = ["homeRating", "awayRating", "homeAdvantage"]
+    if not np.allclose(ratings[columns], replayed.loc[ratings.index, columns]):
+        raise ValueError("ratings differ from a full replay of the matches")
+
+
+def publish(version):
+    # The version directory is complete before the pointer to it is replaced
+    with open(store.CURRENT_PATH + ".tmp", "w") as f:
+        f.write(version)
+    os.replace(store.CURRENT_PATH + ".tmp", store.CURRENT_PATH)
+
+    versions = sorted(
+        name
+        for name in os.listdir(store.VERSIONS_DIR)
+        if os.path.isdir(os.path.join(store.VERSIONS_DIR, name))
+        and not name.startswith(".")
+    )
+    for name in versions[:-KEEP_VERSIONS]:
+        shutil.rmtree(os.path.join(store.VERSIONS_DIR, name), ignore_errors=True)
+
+
+def refresh():
+    # Copy of the current version off to the side, updated by data.py --incremental,
+    # validated and published. Returns the new version, None when nothing changed
+    base_root = store.version_root(store.current_version())
+    version = pd.Timestamp.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    staging = os.path.join(store.VERSIONS_DIR, f".{version}")
+    shutil.copytree(
+        store.data_path("data", base_root),
+        os.path.join(staging, "data"),
+        ignore=shutil.ignore_patterns(*SNAPSHOT_FILES),
+    )
+    try:
+        # Relative data paths resolve in the staging directory
+        subprocess.run(
+            [sys.executable, os.path.join(ROOT, "data.py"), "--incremental"],
+            cwd=staging,
+            check=True,
+        )
+        unchanged = files_digest(staging) == files_digest(base_root)
+        if not unchanged:
+            validate(staging, base_root)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    if unchanged:
+        shutil.rmtree(staging)
+        return None
+
+    os.replace(staging, store.version_root(version))
+    publish(version)
+    return version
+
+
+def watch():
+    # Loads a newly published version in the background, it is swapped in between
+    # requests by before_request
+    global _pending, _failed
+    while True:
+        time.sleep(POLL_SECONDS)
+        version = store.current_version()
+        pending = _pending
+        if version in (store.version(), _failed) or (pending and pending[0] == version):
+            continue
+        try:
+            install = store.load(version)
+        except Exception:
+            log.exception(
+                "loading version %s failed, serving %s", version, store.version()
+            )
+            _failed = version
+            continue
+        with _cond:
+            _pending = (version, install)
+
+
+def start_watcher():
+    # Threads do not survive gunicorn's fork, every worker starts its own
+    global _watcher_pid
+    if _watcher_pid == os.getpid():
+        return
+    with _cond:
+        if _watcher_pid != os.getpid():
+            _watcher_pid = os.getpid()
+            threading.Thread(target=watch, daemon=True).start()
+
+
+def before_request():
+    global _active, _pending, _failed
+    start_watcher()
+    with _cond:
+        # A loaded version is installed once the requests in flight are done, new ones
+        # wait for it. Installing only assigns and clears caches
+        while _pending is not None and _active > 0:
+            _cond.wait()
+        if _pending is not None:
+            version, install = _pending
+            _pending = None
+            try:
+                install()
+            except Exception:
+                # Dropped, every later request would fail on it again
+                _failed = version
+                log.exception(
+                    "installing version %s failed, serving %s", version, store.version()
+                )
+            else:
+                log.info("serving version %s", version)
+        _active += 1
+        flask.g.refresh_counted = True
+
+
+def teardown_request(exception):
+    global _active
+    # Requests answered before before_request counted them are not in _active
+    if not flask.g.pop("refresh_counted", False):
+        return
+    with _cond:
+        _active -= 1
+        _cond.notify_all()
+
+
+def init_app(server):
+    # Registered before the other request hooks, those can answer a request early
+    server.before_request(before_request)
+    server.teardown_request(teardown_request)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Fetch new matches into a new dataset version and publish it to "
+        "the running app"
+    )
+    parser.add_argument(
+        "--every", type=float, default=0, help="repeat every this many seconds"
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    while True:
+        try:
+            version = refresh()
+            if version is None:
+                log.info("no new matches")
+            else:
+                log.info("published version %s", version)
+        except Exception:
+            if not args.every:
+                raise
+            log.exception("refresh failed, the current version stays")
+        if not args.every:
+            break
+        time.sleep(args.every)
@@ -0,0 +1,117 @@
+import pandas as pd
+
+OUTCOMES = ["HOME_TEAM", "AWAY_TEAM", "DRAW"]
+
+# Flattened API field -> column of the match table
+API_FIELDS = {
+    "id": "id",
+    "utcDate": "utcDate",
+    "status": "status",
+    "matchday": "matchday",
+    "stage": "stage",
+    "group": "group",
+    "lastUpdated": "lastUpdated",
+    "season.id": "seasonId",
+    "season.startDate": "seasonStartDate",
+    "season.endDate": "seasonEndDate",
+    "homeTeam.id": "homeTeamId",
+    "homeTeam.name": "homeTeamName",
+    "awayTeam.id": "awayTeamId",
+    "awayTeam.name": "awayTeamName",
+    "score.winner": "winner",
+    "score.duration": "duration",
+    "score.fullTime.homeTeam": "homeGoalsFT",
+    "score.fullTime.awayTeam": "awayGoalsFT",
+    "score.halfTime.homeTeam": "homeGoalsHT",
+    "score.halfTime.awayTeam": "awayGoalsHT",
+}
+
+# Column types of the match table, applied once at ingest
+MATCH_SCHEMA = {
+    "league": "category",
+    "year": "int16",
+    "corona": pd.CategoricalDtype(["pre", "post"]),
+    "matchday": "int8",
+    "utcDate": "datetime64[ns]",
+    "status": "category",
+    "stage": "category",
+    "group": "category",
+    "lastUpdated": "datetime64[ns]",
+    "seasonId": "int32",
+    "seasonStartDate": "datetime64[ns]",
+    "seasonEndDate": "datetime64[ns]",
+    "homeTeamId": "int32",
+    "homeTeamName": "category",
+    "awayTeamId": "int32",
+    "awayTeamName": "category",
+    "winner": pd.CategoricalDtype(OUTCOMES),
+    "duration": "category",
+    "homeGoalsFT": "int8",
+    "awayGoalsFT": "int8",
+    "homeGoalsHT": "int8",
+    "awayGoalsHT": "int8",
+    "refereeId": "Int32",
+    "refereeName": "category",
+}
+
+# Column types of the aggregate cube
+CUBE_SCHEMA = {
+    "league": "category",
+    "year": "int16",
+    "corona": pd.CategoricalDtype(["pre", "post"]),
+    "matchday": "int8",
+    "team": "category",
+    "venue": pd.CategoricalDtype(["home", "away"]),
+    "outcome": pd.CategoricalDtype(OUTCOMES),
+    "matches": "int16",
+    "points": "int16",
+    "goalsFor": "int16",
+    "goalsAgainst": "int16",
+    "goalsForHT": "int16",
+    "goalsAgainstHT": "int16",
+    "firstPlayed": "datetime64[ns]",
+}
+
+
+def normalize_matches(records):
+    # API match records -> scalar columns, nested dicts and odds are not kept
+    flat = pd.json_normalize(records)
+    matches = flat[list(API_FIELDS)].rename(columns=API_FIELDS)
+
+    # The first referee listed is the main referee
+    referees = [referees[0] if referees else {} for referees in flat["referees"]]
+    matches["refereeId"] = [referee.get("id") for referee in referees]
+    matches["refereeName"] = [referee.get("name") for referee in referees]
+
+    # Naive UTC timestamps
+    for col in ["utcDate", "lastUpdated"]:
+        matches[col] = pd.to_datetime(matches[col]).dt.tz_localize(None)
+    return matches.set_index("id")
+
+
+def apply_schema(df, schema=MATCH_SCHEMA):
+    # Matches outside the regular season (playoffs) have no matchday
+    if "matchday" in df:
+        df = df.dropna(subset=["matchday"])
+    df = df.astype({col: dtype for col, dtype in schema.items() if col in df})
+    if df.index.name == "id":
+        df.index = df.index.astype("int32")
+    return df
+
+
+def concat(frames):
+    # pd.concat turns categoricals with different categories into object columns
+    frames = list(frames)
+    for col in frames[0].columns:
+        if isinstance(frames[0][col].dtype, pd.CategoricalDtype) and any(
+            not frame[col].cat.categories.equals(frames[0][col].cat.categories)
+            for frame in frames
+        ):
+            categories = sorted(
+                set().union(*(frame[col].cat.categories for frame in frames))
+            )
+            frames = [
+                frame.assign(**{col: frame[col].cat.set_categories(categories)})
+                for frame in frames
+            ]
+    return pd.concat(frames)
@@ -0,0 +1,222 @@
+import argparse
+import glob
+import hashlib
+import importlib
+import json
+import os
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import flask
+
+import cube
+import elo
+import stats
+import store
+
+# Pointer to the current snapshot, replaced atomically when a build finishes
+SNAPSHOT_PATH = "data/snapshot.json"
+SNAPSHOT_DIR = "data/snapshots"
+
+# SNAPSHOT=0 always computes the callbacks live
+ENABLED = os.environ.get("SNAPSHOT", "1") != "0"
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+_lock = threading.Lock()
+_snapshot = None
+_loaded = False
+
+# Set in every process of the build pool, see start_worker
+_client = None
+
+
+def data_version(root=None):
+    # Changes with the data and with the code rendering the responses, a snapshot of
+    # another version is never served
+    data = sorted(
+        glob.glob(store.data_path(os.path.join(store.DATA_DIR, "*.feather"), root))
+    )
+    data += [
+        store.data_path(path, root)
+        for path in [cube.CUBE_PATH, stats.STATS_PATH, elo.RATINGS_PATH]
+    ]
+    code = sorted(glob.glob(os.path.join(ROOT, "*.py")))
+    code += sorted(glob.glob(os.path.join(ROOT, "assets", "*")))
+    # Contents, not modification times, the same files give the same version
+    digest = hashlib.sha1()
+    for paths, start in [(data, store.data_path("", root) or "."), (code, ROOT)]:
+        for path in paths:
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    digest.update(os.path.relpath(path, start).encode() + f.read())
+    return digest.hexdigest()[:16]
+
+
+def request_key(body):
+    # The year selector is hidden in prepost mode and none of the callbacks read it
+    # there, so it is not part of the key (like functions.query_key)
+    values = {spec["id"]: spec.get("value") for spec in body.get("inputs", [])}
+    if values.get("prepost_or_year") == "prepost":
+        values.pop("yearselector", None)
+    key = json.dumps([body.get("output"), values], sort_keys=True)
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def combinations(module):
+    # Every sidebar state with one league (and one season in the year mode), for every
+    # server callback. Combined selections are computed live
+    import functions
+    from benchmark import callback_payload, server_callbacks
+
+    windows = [
+        (window, window_type)
+        for window in range(1, module.MAX_WINDOW + 1)
+        for window_type in module.WINDOW_TYPES
+    ]
+    keys = store.partition_keys()
+    for league in sorted({league for league, _ in keys}):
+        years = [str(year) for key_league, year in keys if key_league == league]
+        for mode, year in [("prepost", years[-1])] + [("year", year) for year in years]:
+            teams = [None] + list(functions.team_names(mode, [league], [year]))
+            for output in server_callbacks(module.app):
+                inputs = module.app.callback_map[output]["inputs"]
+                ids = {spec["id"] for spec in inputs}
+                for team in teams if "teamselector" in ids else [None]:
+                    for window, window_type in (
+                        windows if "windowselector" in ids else [(None, None)]
+                    ):
+                        values = {
+                            "prepost_or_year": mode,
+                            "leagueselector": [league],
+                            "yearselector": [year],
+                            "teamselector": team,
+                            "windowselector": window,
+                            "windowtype": window_type,
+                        }
+                        yield callback_payload(output, inputs, values)
+
+
+def start_worker():
+    global _client
+    _client = importlib.import_module("app").server.test_client()
+
+
+def render(payload):
+    # Live response of one callback, the snapshot is never read while building
+    response = _client.post(
+        "/_dash-update-component",
+        json=payload,
+        headers={"X-Snapshot-Build": "1"},
+    )
+    return request_key(payload), response.status_code, response.get_data()
+
+
+def build(workers=None):
+    version = data_version()
+    directory = os.path.join(SNAPSHOT_DIR, version)
+    os.makedirs(directory, exist_ok=True)
+
+    payloads = list(combinations(importlib.import_module("app")))
+    responses = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=start_worker) as executor:
+        for name, status, data in executor.map(render, payloads, chunksize=32):
+            if status not in (200, 204):
+                continue
+            responses[name] = status
+            with open(os.path.join(directory, name + ".json"), "wb") as f:
+                f.write(data)
+
+    snapshot = {"version": version, "directory": directory, "responses": responses}
+    with open(SNAPSHOT_PATH + ".tmp", "w") as f:
+        json.dump(snapshot, f)
+    os.replace(SNAPSHOT_PATH + ".tmp", SNAPSHOT_PATH)
+
+    # Older snapshots, a running app keeps serving its files until it reloads
+    for old in glob.glob(os.path.join(SNAPSHOT_DIR, "*")):
+        if old != directory:
+            shutil.rmtree(old, ignore_errors=True)
+    return snapshot
+
+
+def read_snapshot(root=None):
+    path = store.data_path(SNAPSHOT_PATH, root)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        snapshot = json.load(f)
+    if snapshot["version"] != data_version(root):
+        # Built for other data or code, python snapshot.py builds a new one
+        return None
+    snapshot["directory"] = store.data_path(snapshot["directory"], root)
+    return snapshot
+
+
+def get_snapshot():
+    global _snapshot, _loaded
+    if not _loaded:
+        with _lock:
+            if not _loaded:
+                _snapshot = read_snapshot()
+                _loaded = True
+    return _snapshot
+
+
+@store.on_reload
+def clear_snapshot():
+    global _snapshot, _loaded
+    with _lock:
+        _snapshot = None
+        _loaded = False
+
+
+@store.on_load
+def load_snapshot(root):
+    snapshot = read_snapshot(root)
+
+    def install():
+        global _snapshot, _loaded
+        with _lock:
+            _snapshot, _loaded = snapshot, True
+
+    return install
+
+
+def before_request():
+    if not flask.request.path.endswith("/_dash-update-component"):
+        return None
+    if "X-Snapshot-Build" in flask.request.headers:
+        return None
+    snapshot = get_snapshot()
+    if snapshot is None:
+        return None
+    name = request_key(flask.request.get_json(silent=True) or {})
+    status = snapshot["responses"].get(name)
+    if status is None:
+        # Not precomputed, Dash runs the callback
+        return None
+    try:
+        with open(os.path.join(snapshot["directory"], name + ".json"), "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    return flask.Response(data, status=status, mimetype="application/json")
+
+
+def init_app(server):
+    if not ENABLED:
+        return
+    server.before_request(before_request)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Render every callback output for every single league and season "
+        "into data/snapshots, served by the app instead of computing them"
+    )
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    snapshot = build(args.workers)
+    print(f"{len(snapshot['responses'])} responses in {snapshot['directory']}")
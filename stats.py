@@ -0,0 +1,202 @@
+import json
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+import cube
+import store
+from schema import OUTCOMES
+
+STATS_PATH = "data/stats.json"
+
+REPLICATES = 20000
+CONFIDENCE = 0.95
+SEED = 0
+
+# Points of the home team for a home win, an away win and a draw, in OUTCOMES order
+HOME_POINTS = np.array([3, 0, 1])
+
+_lock = threading.Lock()
+_stats = None
+
+
+def home_statistics(counts):
+    # counts: [..., home wins, away wins, draws], one row per (re)sample
+    n = counts.sum(axis=-1)
+    return {
+        "homeWinRate": counts[..., 0] / n,
+        "homePoints": counts @ HOME_POINTS / n,
+    }
+
+
+def bootstrap(counts, rng, replicates):
+    # Resampling n matches with replacement only changes how many matches of each
+    # outcome are drawn, so every replicate is one multinomial draw of the counts
+    n = counts.sum()
+    return rng.multinomial(n, counts / n, size=replicates)
+
+
+def permute(pre, post, rng, replicates):
+    # Shuffling the pre/post labels: the pre group is a draw without replacement
+    # from the pooled matches, the post group gets the rest
+    pooled = pre + post
+    pre_draws = rng.multivariate_hypergeometric(pooled, pre.sum(), size=replicates)
+    return pre_draws, pooled - pre_draws
+
+
+def interval(values, confidence):
+    tail = (1 - confidence) / 2 * 100
+    return np.percentile(values, [tail, 100 - tail]).tolist()
+
+
+def compare(pre, post, replicates=REPLICATES, confidence=CONFIDENCE, seed=SEED):
+    # Bootstrap intervals and a two-sided permutation test, pre vs post corona
+    pre, post = np.asarray(pre), np.asarray(post)
+    if pre.sum() == 0 or post.sum() == 0:
+        return None
+
+    rng = np.random.default_rng(seed)
+    observed_pre, observed_post = home_statistics(pre), home_statistics(post)
+    boot_pre = home_statistics(bootstrap(pre, rng, replicates))
+    boot_post = home_statistics(bootstrap(post, rng, replicates))
+    perm_pre, perm_post = map(home_statistics, permute(pre, post, rng, replicates))
+
+    results = {"matches": [int(pre.sum()), int(post.sum())]}
+    for stat in observed_pre:
+        difference = observed_post[stat] - observed_pre[stat]
+        null = perm_post[stat] - perm_pre[stat]
+        # Permuted differences can equal the observed one, up to rounding
+        extreme = np.abs(null) >= abs(difference) - 1e-12
+        results[stat] = {
+            "pre": float(observed_pre[stat]),
+            "post": float(observed_post[stat]),
+            "difference": float(difference),
+            "preInterval": interval(boot_pre[stat], confidence),
+            "postInterval": interval(boot_post[stat], confidence),
+            "differenceInterval": interval(
+                boot_post[stat] - boot_pre[stat], confidence
+            ),
+            "pValue": float((extreme.sum() + 1) / (replicates + 1)),
+        }
+    return results
+
+
+def outcome_counts(cube_df):
+    # Home wins, away wins and draws per league, before and after corona
+    home = cube_df[cube_df["venue"] == "home"]
+    leagues = sorted(home["league"].unique())
+    index = pd.MultiIndex.from_product([leagues, ["pre", "post"], OUTCOMES])
+    counts = (
+        home.groupby(["league", "corona", "outcome"], observed=True)["matches"]
+        .sum()
+        .reindex(index, fill_value=0)
+    )
+    counts = counts.to_numpy().reshape(len(leagues), 2, len(OUTCOMES))
+    return dict(zip(leagues, counts))
+
+
+def compute(cube_df, workers=None):
+    # One league per process, the resampling is independent per league
+    counts = outcome_counts(cube_df)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(
+            compare,
+            [pre for pre, _ in counts.values()],
+            [post for _, post in counts.values()],
+        )
+        return {
+            league: {"counts": league_counts.tolist(), "results": result}
+            for (league, league_counts), result in zip(counts.items(), results)
+        }
+
+
+def write_stats(stats, path=STATS_PATH):
+    with open(path + ".tmp", "w") as f:
+        json.dump(stats, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+def read_stats(root=None):
+    path = store.data_path(STATS_PATH, root)
+    if not os.path.exists(path):
+        # No stats from data.py yet, compute them from the cube
+        return compute(cube.read_cube(root))
+    with open(path) as f:
+        return json.load(f)
+
+
+def get_stats():
+    global _stats
+    if _stats is None:
+        with _lock:
+            if _stats is None:
+                _stats = read_stats()
+    return _stats
+
+
+@store.on_reload
+def clear_stats():
+    global _stats
+    with _lock:
+        _stats = None
+    selection_stats.cache_clear()
+
+
+@store.on_load
+def load_stats(root):
+    stats = read_stats(root)
+
+    def install():
+        global _stats
+        with _lock:
+            _stats = stats
+
+    return install
+
+
+@lru_cache(maxsize=64)
+def selection_stats(leagues):
+    # Precomputed per league, combined selections are tested on their summed counts
+    stats = get_stats()
+    leagues = [league for league in leagues if league in stats]
+    if len(leagues) == 1:
+        return stats[leagues[0]]["results"]
+    if not leagues:
+        return None
+    pre = sum(np.array(stats[league]["counts"][0]) for league in leagues)
+    post = sum(np.array(stats[league]["counts"][1]) for league in leagues)
+    return compare(pre, post)
+
+
+def summary_table(results, confidence=CONFIDENCE):
+    # Markdown table for the pre/post view
+    if results is None:
+        return ""
+    rows = [
+        ("Home win rate", results["homeWinRate"], "{:.1%}"),
+        ("Home points per game", results["homePoints"], "{:.2f}"),
+    ]
+    lines = [
+        "| | Before corona | After corona | Difference | p-value |",
+        "|---|---|---|---|---|",
+    ]
+    for label, stat, fmt in rows:
+        cells = [
+            f"{fmt.format(stat[key])} ({fmt.format(low)} to {fmt.format(high)})"
+            for key, (low, high) in [
+                ("pre", stat["preInterval"]),
+                ("post", stat["postInterval"]),
+                ("difference", stat["differenceInterval"]),
+            ]
+        ]
+        lines.append(f"| {label} | {' | '.join(cells)} | {stat['pValue']:.3f} |")
+    pre, post = results["matches"]
+    lines.append(
+        f"\n{confidence:.0%} bootstrap intervals, p-values from a permutation test "
+        f"of the before/after labels ({pre} matches before, {post} after)."
+    )
+    return "\n".join(lines)
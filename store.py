@@ -0,0 +1,192 @@
+import glob
+import os
+import threading
+
+import pandas as pd
+import pyarrow.feather as feather
+
+import schema
+
+DATA_DIR = "data/matches"
+
+# Dataset versions published by refresh.py, each a directory with its own data/. Without
+# a published version data/ is read as it is
+VERSIONS_DIR = "versions"
+CURRENT_PATH = os.path.join(VERSIONS_DIR, "current")
+
+# Only the columns the dashboard actually uses are read from disk
+COLUMNS = [
+    "league",
+    "year",
+    "corona",
+    "matchday",
+    "utcDate",
+    "winner",
+    "homeTeamName",
+    "awayTeamName",
+    "homeGoalsFT",
+    "awayGoalsFT",
+    "homeGoalsHT",
+    "awayGoalsHT",
+]
+
+_lock = threading.Lock()
+_version = None
+_root = ""
+_keys = None
+_partitions = {}
+_reload_hooks = []
+_loaders = []
+
+
+def current_version():
+    # Latest published version, the pointer file is replaced atomically
+    try:
+        with open(CURRENT_PATH) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def version_root(version):
+    return os.path.join(VERSIONS_DIR, version) if version else ""
+
+
+def version():
+    return _version
+
+
+def data_path(path, root=None):
+    # Relative data paths resolve in the directory of the version in use
+    return os.path.join(_root if root is None else root, path)
+
+
+def partition_path(league, year, data_dir=None):
+    return os.path.join(data_dir or data_path(DATA_DIR), f"{league}_{year}.feather")
+
+
+def list_partitions(data_dir=None):
+    data_dir = data_dir or data_path(DATA_DIR)
+    keys = []
+    for path in sorted(glob.glob(os.path.join(data_dir, "*.feather"))):
+        league, year = os.path.basename(path)[: -len(".feather")].rsplit("_", 1)
+        keys.append((league, int(year)))
+    return keys
+
+
+def partition_keys():
+    global _keys
+    if _keys is None:
+        _keys = list_partitions()
+    return _keys
+
+
+def write_feather(df, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write next to the target and rename, readers never see a half-written file
+    df.to_feather(path + ".tmp", compression="uncompressed")
+    os.replace(path + ".tmp", path)
+
+
+def write_partition(df, league, year, data_dir=None):
+    write_feather(df.reset_index(), partition_path(league, year, data_dir))
+
+
+def read_partition(league, year, columns=None, data_dir=None):
+    # Uncompressed feather files are memory-mapped, only the requested columns are read
+    table = feather.read_table(
+        partition_path(league, year, data_dir), columns=columns, memory_map=True
+    )
+    df = table.to_pandas()
+    if "id" in df:
+        df = df.set_index("id")
+    return df
+
+
+def load_partition(league, year):
+    return read_partition(league, year, columns=["id"] + COLUMNS)
+
+
+def get_partition(league, year):
+    key = (league, year)
+    if key not in _partitions:
+        with _lock:
+            if key not in _partitions:
+                _partitions[key] = load_partition(league, year)
+    return _partitions[key]
+
+
+def on_reload(hook):
+    # Caches built on top of the store register here to be cleared on refresh
+    _reload_hooks.append(hook)
+    return hook
+
+
+def on_load(loader):
+    # Data built from the files of a version registers here: loader(root) reads it off
+    # the request path and returns a function installing the result, see load
+    _loaders.append(loader)
+    return loader
+
+
+def reload():
+    global _keys, _partitions
+    with _lock:
+        _keys = None
+        _partitions = {}
+    for hook in _reload_hooks:
+        hook()
+
+
+def use_version(version):
+    # Read a version lazily from now on, at startup
+    global _version, _root
+    with _lock:
+        _version, _root = version, version_root(version)
+    reload()
+
+
+def load(version):
+    # Everything a version keeps in memory, read while the current one is still served.
+    # The returned install swaps it in, which only assigns and clears caches
+    root = version_root(version)
+    data_dir = data_path(DATA_DIR, root)
+    keys = list_partitions(data_dir)
+    partitions = {
+        key: read_partition(*key, columns=["id"] + COLUMNS, data_dir=data_dir)
+        for key in keys
+    }
+    installs = [loader(root) for loader in _loaders]
+
+    def install():
+        global _version, _root, _keys, _partitions
+        with _lock:
+            _version, _root, _keys, _partitions = version, root, keys, partitions
+        for hook in _reload_hooks:
+            hook()
+        for install_loaded in installs:
+            install_loaded()
+
+    return install
+
+
+def preload():
+    for league, year in partition_keys():
+        get_partition(league, year)
+
+
+def select(league, year=None, corona=None):
+    # Partition pruning: only the (league, year) files that can match are loaded
+    frames = [
+        get_partition(key_league, key_year)
+        for key_league, key_year in partition_keys()
+        if key_league == league and (year is None or key_year == year)
+    ]
+    if not frames:
+        return pd.DataFrame(columns=COLUMNS)
+
+    df = schema.concat(frames)
+    if corona is not None:
+        # Boolean indexing returns a new frame, the stored partitions are never handed out
+        return df[df["corona"] == corona]
+    return df
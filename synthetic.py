@@ -0,0 +1,161 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+import cube
+import data
+import schema
+import store
+
+# Teams per league in the real data
+LEAGUE_TEAMS = {"BL1": 18, "DED": 18, "FL1": 20, "PL": 20, "SA": 20, "PD": 20}
+
+# Goals per match at home and away, before and after fans were excluded
+GOAL_RATES = {"pre": (1.55, 1.20), "post": (1.45, 1.30)}
+
+# Last season in the real data, earlier seasons are added for the bigger volumes
+LAST_SEASON = 2020
+
+# Length of the break in the season that was interrupted
+CORONA_BREAK = pd.Timedelta(days=80)
+
+
+def shape(scale):
+    # Up to 10x more history, beyond that also more leagues. Leagues keep their real
+    # number of teams, bigger ones would play seasons of more than 99 matchdays
+    seasons_factor = min(scale, 10)
+    copies = max(round(scale / seasons_factor), 1)
+    return 3 * seasons_factor, copies
+
+
+def round_robin(n_teams):
+    # Circle method, every team meets every other team once per half season
+    order = np.arange(n_teams)
+    rounds = []
+    for r in range(n_teams - 1):
+        rotated = np.concatenate([order[:1], np.roll(order[1:], r)])
+        home, away = rotated[: n_teams // 2], rotated[::-1][: n_teams // 2]
+        # Alternate so teams do not play every match of a half season at home
+        rounds.append((away, home) if r % 2 else (home, away))
+    # Second half of the season with home and away swapped
+    rounds += [(away, home) for home, away in rounds]
+    return rounds
+
+
+def generate_season(league, league_index, season, n_teams, fans_excluded_after, rng):
+    rounds = round_robin(n_teams)
+    n_matchdays = len(rounds)
+    per_matchday = n_teams // 2
+
+    # Matchdays spread evenly from August to the end of May, matches over a weekend
+    start = pd.Timestamp(f"{season}-08-10 12:00")
+    spacing = (pd.Timedelta(days=295) / n_matchdays).floor("H")
+    matchday = np.repeat(np.arange(1, n_matchdays + 1), per_matchday)
+    utc_date = (
+        start
+        + (matchday - 1) * spacing
+        + pd.to_timedelta(rng.integers(0, 3, len(matchday)), unit="D")
+        + pd.to_timedelta(rng.choice([0, 150, 270, 390], len(matchday)), unit="m")
+    )
+    # The season that was interrupted resumes after a break
+    if start <= fans_excluded_after:
+        utc_date = utc_date.where(
+            utc_date <= fans_excluded_after, utc_date + CORONA_BREAK
+        )
+    fans_excluded = np.asarray(utc_date > fans_excluded_after)
+
+    home_rate, away_rate = np.where(
+        fans_excluded[:, None], GOAL_RATES["post"], GOAL_RATES["pre"]
+    ).T
+    home_goals = rng.poisson(home_rate)
+    away_goals = rng.poisson(away_rate)
+    winner = np.select(
+        [home_goals > away_goals, home_goals < away_goals],
+        ["HOME_TEAM", "AWAY_TEAM"],
+        "DRAW",
+    )
+
+    team_ids = np.arange(n_teams) + 1000 * (league_index + 1)
+    team_names = np.array([f"{league} Team {i + 1:03d}" for i in range(n_teams)])
+    home = np.concatenate([home for home, _ in rounds])
+    away = np.concatenate([away for _, away in rounds])
+    n_referees = max(n_teams, 10)
+    referee = rng.integers(0, n_referees, len(matchday))
+
+    matches = pd.DataFrame(
+        {
+            "id": season * 10**7 + league_index * 10**4 + np.arange(len(matchday)),
+            "utcDate": utc_date,
+            "status": "FINISHED",
+            "matchday": matchday,
+            "stage": "REGULAR_SEASON",
+            "group": "Regular Season",
+            "lastUpdated": utc_date + pd.Timedelta(hours=3),
+            "seasonId": season * 10**4 + league_index,
+            "seasonStartDate": start.normalize(),
+            "seasonEndDate": utc_date.max().normalize(),
+            "homeTeamId": team_ids[home],
+            "homeTeamName": team_names[home],
+            "awayTeamId": team_ids[away],
+            "awayTeamName": team_names[away],
+            "winner": winner,
+            "duration": "REGULAR",
+            "homeGoalsFT": home_goals,
+            "awayGoalsFT": away_goals,
+            "homeGoalsHT": rng.binomial(home_goals, 0.45),
+            "awayGoalsHT": rng.binomial(away_goals, 0.45),
+            "refereeId": 90000 + referee,
+            "refereeName": [f"Referee {i + 1:03d}" for i in referee],
+            "league": league,
+            "year": season,
+        }
+    ).set_index("id")
+    matches = matches.sort_values(by="utcDate", kind="mergesort")
+    matches = data.label_corona(matches, fans_excluded_after)
+    return schema.apply_schema(matches)
+
+
+def generate(directory, scale=1, seed=0):
+    # Writes data/matches and data/cube.feather under directory, like data.py does
+    rng = np.random.default_rng(seed)
+    n_seasons, copies = shape(scale)
+    fan_exclusions = data.read_fan_exclusions()
+    data_dir = os.path.join(directory, store.DATA_DIR)
+
+    # The real leagues, then copies of them named PL2, PL3, ... for the bigger volumes
+    leagues = [
+        (base_league + (str(copy + 1) if copy else ""), base_league, n_teams)
+        for copy in range(copies)
+        for base_league, n_teams in LEAGUE_TEAMS.items()
+    ]
+    frames = []
+    for league_index, (league, base_league, n_teams) in enumerate(leagues):
+        for season in range(LAST_SEASON - n_seasons + 1, LAST_SEASON + 1):
+            matches = generate_season(
+                league,
+                league_index,
+                season,
+                n_teams,
+                fan_exclusions.loc[base_league, "fans_excluded_after"],
+                rng,
+            )
+            store.write_partition(matches, league, season, data_dir)
+            frames.append(matches[store.COLUMNS])
+
+    matches = schema.concat(frames)
+    cube.write_cube(cube.build_cube(matches), os.path.join(directory, cube.CUBE_PATH))
+    return len(matches)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generate synthetic match data for benchmarks and load tests"
+    )
+    parser.add_argument("directory")
+    parser.add_argument("--scale", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    n_matches = generate(args.directory, args.scale, args.seed)
+    print(f"{n_matches} matches written to {args.directory}")